@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram, registry
+
+active_gauge = registry.register(Gauge(
+    "inference_admission_active", "Inference requests currently holding an upstream slot.",
+))
+queued_gauge = registry.register(Gauge(
+    "inference_admission_queued", "Inference requests waiting for a slot.",
+))
+wait_histogram = registry.register(Histogram(
+    "inference_admission_wait_seconds", "Time admitted inference requests spent queued.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
+rejected_counter = registry.register(Counter(
+    "inference_admission_rejected_total", "Inference requests turned away, by reason.", ("reason",),
+))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A held slot; release() is idempotent so every exit path can call it."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    """
+    Caps concurrent upstream inference calls. Requests beyond the cap wait in
+    per-user FIFO queues served round-robin, so one busy user cannot starve the
+    rest; a full queue rejects immediately and a long wait times out.
+    Lives on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_queue_per_user: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._queued = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "user_queue_full": 0, "timeout": 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waited = 0
+
+    def _reject(self, reason: str, detail: str):
+        self.rejected[reason] += 1
+        rejected_counter.labels(reason).inc()
+        raise AdmissionRejected(reason, detail, retry_after=max(1.0, self.queue_timeout / 2))
+
+    async def acquire(self, user_id: str) -> Ticket:
+        if self._active < self.max_concurrent and not self._queued:
+            self._grant(0.0)
+            return Ticket(self)
+
+        if self._queued >= self.max_queue:
+            self._reject("queue_full", "Inference is saturated, retry later")
+        queue = self._waiters.get(user_id)
+        if queue is not None and len(queue) >= self.max_queue_per_user:
+            self._reject("user_queue_full", "Too many queued inference requests for this user")
+
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._waiters[user_id] = deque()
+        queue.append(future)
+        self._set_queued(1)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                self._forget(user_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", f"Waited {self.queue_timeout:g}s for an inference slot")
+            raise
+        wait = time.monotonic() - start
+        self._record_wait(wait)
+        self.admitted += 1
+        return Ticket(self)
+
+    @asynccontextmanager
+    async def admit(self, user_id: str):
+        ticket = await self.acquire(user_id)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def _grant(self, wait: float):
+        self._active += 1
+        active_gauge.labels().inc()
+        self.admitted += 1
+        self._record_wait(wait)
+
+    def _record_wait(self, wait: float):
+        self._waited += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        wait_histogram.labels().observe(wait)
+
+    def _set_queued(self, delta: int):
+        self._queued += delta
+        queued_gauge.labels().inc(delta)
+
+    def _forget(self, user_id: str, future: asyncio.Future):
+        queue = self._waiters.get(user_id)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._set_queued(-1)
+            if not queue:
+                del self._waiters[user_id]
+
+    def _release(self):
+        # Hand the slot straight to the next user in round-robin order
+        while self._waiters:
+            user_id, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            self._set_queued(-1)
+            if queue:
+                self._waiters.move_to_end(user_id)
+            else:
+                del self._waiters[user_id]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+        active_gauge.labels().dec()
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.max_concurrent,
+            "active": self._active,
+            "queued": self._queued,
+            "queued_users": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_ms": {
+                "mean": round(self._wait_total / self._waited * 1000, 2) if self._waited else 0.0,
+                "max": round(self._wait_max * 1000, 2),
+            },
+        }
+
+
+inference_admission = AdmissionController(
+    max_concurrent=settings.INFERENCE_MAX_CONCURRENCY,
+    max_queue=settings.INFERENCE_MAX_QUEUE,
+    max_queue_per_user=settings.INFERENCE_MAX_QUEUE_PER_USER,
+    queue_timeout=settings.INFERENCE_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,235 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Telemetry rows store this instead of inline image bytes
+BLOB_REF_PREFIX = "blob:sha256:"
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_MAGIC_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST_RE.match(value))
+
+
+def sniff_content_type(data: bytes) -> str:
+    for magic, content_type in _MAGIC_TYPES:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class BlobStore(ABC):
+    """Content-addressed storage: blobs are written once and named by their SHA-256."""
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool: ...
+
+    @abstractmethod
+    def _write(self, digest: str, data: bytes): ...
+
+    @abstractmethod
+    def get(self, digest: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def delete(self, digest: str): ...
+
+    @abstractmethod
+    def list_blobs(self) -> Iterator[Tuple[str, float]]:
+        """Yield (digest, last modified unix time) for every stored blob."""
+
+    def _touch(self, digest: str, data: bytes):
+        self._write(digest, data)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        # Identical images are stored once, but a re-upload counts as new for the
+        # sweeper's grace period so a blob isn't collected just as a row starts using it again
+        if self.exists(digest):
+            self._touch(digest, data)
+        else:
+            self._write(digest, data)
+        return digest
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def _write(self, digest: str, data: bytes):
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, digest: str):
+        self._path(digest).unlink(missing_ok=True)
+
+    def _touch(self, digest: str, data: bytes):
+        try:
+            os.utime(self._path(digest))
+        except FileNotFoundError:
+            self._write(digest, data)
+
+    def list_blobs(self) -> Iterator[Tuple[str, float]]:
+        for path in self.root.glob("*/*/*"):
+            # Skips half-written .tmp files
+            if not is_digest(path.name):
+                continue
+            try:
+                yield path.name, path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+
+
+class SupabaseBlobStore(BlobStore):
+    """Blobs in a Supabase Storage bucket, written with the admin client."""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def _bucket(self):
+        from app.core.database import get_supabase_admin
+        return get_supabase_admin().storage.from_(self.bucket)
+
+    @staticmethod
+    def _path(digest: str) -> str:
+        return f"{digest[:2]}/{digest}"
+
+    def exists(self, digest: str) -> bool:
+        return self._bucket().exists(self._path(digest))
+
+    def _write(self, digest: str, data: bytes):
+        self._bucket().upload(
+            self._path(digest),
+            data,
+            {"content-type": sniff_content_type(data), "upsert": "true"},
+        )
+
+    def get(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._bucket().download(self._path(digest))
+        except Exception:
+            return None
+
+    def delete(self, digest: str):
+        self._bucket().remove([self._path(digest)])
+
+    def list_blobs(self, page_size: int = 1000) -> Iterator[Tuple[str, float]]:
+        bucket = self._bucket()
+        for folder in bucket.list(""):
+            offset = 0
+            while True:
+                entries = bucket.list(folder["name"], {"limit": page_size, "offset": offset})
+                for entry in entries:
+                    if is_digest(entry["name"]):
+                        modified = entry.get("updated_at") or entry.get("created_at")
+                        yield entry["name"], datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp()
+                if len(entries) < page_size:
+                    break
+                offset += page_size
+
+
+def _decode_inline_image(image_data: str) -> Optional[bytes]:
+    """Bytes of a base64 (or data: URL) image, or None if the value isn't inline image data."""
+    if image_data.startswith("data:"):
+        _, _, image_data = image_data.partition(",")
+    try:
+        return base64.b64decode(image_data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def offload_image(image_data: Optional[str]) -> Optional[str]:
+    """
+    Replace inline base64 image data with a blob reference. URLs, existing
+    references and anything that doesn't decode are returned unchanged.
+    """
+    if not image_data or image_data.startswith((BLOB_REF_PREFIX, "http://", "https://")):
+        return image_data
+    data = _decode_inline_image(image_data)
+    # Short strings can happen to be valid base64; only offload what looks like an image
+    if not data or (len(data) < 1024 and sniff_content_type(data) == "application/octet-stream"):
+        return image_data
+    if len(data) > settings.BLOB_MAX_BYTES:
+        raise BlobTooLarge()
+    return BLOB_REF_PREFIX + blob_store.put(data)
+
+
+def blob_refs(rows: Iterable[Dict]) -> Set[str]:
+    """Blob references held by telemetry rows."""
+    refs = set()
+    for row in rows:
+        image_data = (row.get("payload") or {}).get("image_data")
+        if isinstance(image_data, str) and image_data.startswith(BLOB_REF_PREFIX):
+            refs.add(image_data)
+    return refs
+
+
+def sweep_unreferenced(referenced: Set[str], grace: float) -> Dict[str, int]:
+    """
+    Delete blobs that `referenced` doesn't contain and that haven't been written for
+    `grace` seconds. `referenced` must be collected before calling, from every place a
+    reference can live (stored, queued and dead-lettered rows); the grace period covers
+    rows that were between offload_image() and being queued or stored while it was collected.
+    """
+    cutoff = time.time() - grace
+    counts = {"kept": 0, "recent": 0, "deleted": 0, "failed": 0}
+    for digest, modified in blob_store.list_blobs():
+        if BLOB_REF_PREFIX + digest in referenced:
+            counts["kept"] += 1
+        elif modified > cutoff:
+            counts["recent"] += 1
+        else:
+            try:
+                blob_store.delete(digest)
+                counts["deleted"] += 1
+            except Exception as e:
+                logger.warning("Could not delete blob %s: %s", digest, e)
+                counts["failed"] += 1
+    return counts
+
+
+def _create_blob_store() -> BlobStore:
+    if settings.BLOB_STORE_BACKEND == "supabase":
+        return SupabaseBlobStore(settings.BLOB_STORE_BUCKET)
+    return LocalBlobStore(settings.BLOB_STORE_DIR)
+
+
+blob_store = _create_blob_store()
@@ -8,5 +8,127 @@ class Settings:
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", os.getenv("OPENAI_API_KEY", ""))
+    # Point at a local mock (app.testing.mock_gemini) for tests and benchmarks
+    GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+    GEMINI_POOL_SIZE: int = int(os.getenv("GEMINI_POOL_SIZE", "32"))
+    GEMINI_CONNECT_TIMEOUT: float = float(os.getenv("GEMINI_CONNECT_TIMEOUT", "5"))
+    GEMINI_READ_TIMEOUT: float = float(os.getenv("GEMINI_READ_TIMEOUT", "45"))
+    IMAGE_FETCH_TIMEOUT: float = float(os.getenv("IMAGE_FETCH_TIMEOUT", "30"))
+
+    # VLM image pipeline (resizing needs the optional Pillow dependency)
+    VLM_IMAGE_MAX_BYTES: int = int(os.getenv("VLM_IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+    VLM_IMAGE_MAX_DIM: int = int(os.getenv("VLM_IMAGE_MAX_DIM", "1536"))
+    # Images with more pixels than this are rejected before decoding (decompression bombs)
+    VLM_IMAGE_MAX_PIXELS: int = int(os.getenv("VLM_IMAGE_MAX_PIXELS", str(40_000_000)))
+    VLM_IMAGE_QUALITY: int = int(os.getenv("VLM_IMAGE_QUALITY", "85"))
+    VLM_IMAGE_CACHE_SIZE: int = int(os.getenv("VLM_IMAGE_CACHE_SIZE", "256"))
+    VLM_IMAGE_CACHE_TTL: float = float(os.getenv("VLM_IMAGE_CACHE_TTL", "3600"))
+
+    # Model routing: circuit breaker per Gemini model and optional hedging
+    MODEL_FAILURE_THRESHOLD: int = int(os.getenv("MODEL_FAILURE_THRESHOLD", "3"))
+    MODEL_COOLDOWN: float = float(os.getenv("MODEL_COOLDOWN", "30"))
+    MODEL_NOT_FOUND_COOLDOWN: float = float(os.getenv("MODEL_NOT_FOUND_COOLDOWN", "3600"))
+    MODEL_LATENCY_EWMA_ALPHA: float = float(os.getenv("MODEL_LATENCY_EWMA_ALPHA", "0.2"))
+    # Seconds before a slow request is raced against the next model (0 = no hedging)
+    INFERENCE_HEDGE_AFTER: float = float(os.getenv("INFERENCE_HEDGE_AFTER", "0"))
+
+    # Inference admission: concurrent upstream calls, then a bounded per-user fair queue
+    INFERENCE_MAX_CONCURRENCY: int = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "32"))
+    INFERENCE_MAX_QUEUE: int = int(os.getenv("INFERENCE_MAX_QUEUE", "128"))
+    INFERENCE_MAX_QUEUE_PER_USER: int = int(os.getenv("INFERENCE_MAX_QUEUE_PER_USER", "8"))
+    INFERENCE_QUEUE_TIMEOUT: float = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "10"))
+
+    # Inference response cache (set INFERENCE_CACHE_TTL=0 to disable, INFERENCE_CACHE_DIR for a disk tier)
+    INFERENCE_CACHE_SIZE: int = int(os.getenv("INFERENCE_CACHE_SIZE", "1024"))
+    INFERENCE_CACHE_TTL: float = float(os.getenv("INFERENCE_CACHE_TTL", "3600"))
+    INFERENCE_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("INFERENCE_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+    INFERENCE_CACHE_DIR: str = os.getenv("INFERENCE_CACHE_DIR", "")
+    INFERENCE_CACHE_DISK_MAX_BYTES: int = int(os.getenv("INFERENCE_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # Local JWT verification: set the project's JWT secret (HS256) or a JWKS URL
+    # (asymmetric keys). When neither is set, tokens are checked via supabase.auth.get_user.
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWKS_URL: str = os.getenv("SUPABASE_JWKS_URL", "")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_TOKEN_CACHE_TTL: float = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+
+    # Maximum number of readings accepted by a single batch ingest request
+    INGEST_MAX_BATCH_SIZE: int = int(os.getenv("INGEST_MAX_BATCH_SIZE", "1000"))
+    # Cap on ingest bodies, before and after gzip/zstd decompression
+    INGEST_MAX_BODY_BYTES: int = int(os.getenv("INGEST_MAX_BODY_BYTES", str(32 * 1024 * 1024)))
+
+    # Write-behind ingest: readings are queued and bulk inserted in the background
+    INGEST_WRITE_BEHIND: bool = os.getenv("INGEST_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+    INGEST_BUFFER_MAX_ROWS: int = int(os.getenv("INGEST_BUFFER_MAX_ROWS", "10000"))
+    INGEST_FLUSH_ROWS: int = int(os.getenv("INGEST_FLUSH_ROWS", "500"))
+    INGEST_FLUSH_INTERVAL: float = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+    # Rows the buffer gives up on are appended here as JSON lines (empty = only logged)
+    INGEST_DEAD_LETTER_FILE: str = os.getenv("INGEST_DEAD_LETTER_FILE", "data/ingest_dead_letter.jsonl")
+
+    # Telemetry ID worker id (0-1023). Unset, each process claims a free slot by locking a
+    # file in WORKER_ID_DIR, which only coordinates workers on one host
+    WORKER_ID: str = os.getenv("WORKER_ID", "")
+    WORKER_ID_DIR: str = os.getenv("WORKER_ID_DIR", "data/workers")
+
+    # WebSocket ingest sessions write (and ack) every INGEST_WS_FLUSH_ROWS readings or INGEST_WS_FLUSH_INTERVAL seconds
+    INGEST_WS_FLUSH_ROWS: int = int(os.getenv("INGEST_WS_FLUSH_ROWS", "500"))
+    INGEST_WS_FLUSH_INTERVAL: float = float(os.getenv("INGEST_WS_FLUSH_INTERVAL", "1.0"))
+
+    # Blob storage for telemetry images: "local" (BLOB_STORE_DIR) or "supabase" (Storage bucket)
+    BLOB_STORE_BACKEND: str = os.getenv("BLOB_STORE_BACKEND", "local")
+    BLOB_STORE_DIR: str = os.getenv("BLOB_STORE_DIR", "data/blobs")
+    BLOB_STORE_BUCKET: str = os.getenv("BLOB_STORE_BUCKET", "telemetry-images")
+    BLOB_MAX_BYTES: int = int(os.getenv("BLOB_MAX_BYTES", str(10 * 1024 * 1024)))
+    # POST /blobs/gc only deletes unreferenced blobs not written for this many seconds
+    BLOB_GC_GRACE: float = float(os.getenv("BLOB_GC_GRACE", "86400"))
+
+    # Device registry cache (device_id -> owner_id)
+    DEVICE_CACHE_SIZE: int = int(os.getenv("DEVICE_CACHE_SIZE", "10000"))
+    DEVICE_CACHE_TTL: float = float(os.getenv("DEVICE_CACHE_TTL", "300"))
+    # Unknown devices are remembered this long. Another worker's cache can't be invalidated,
+    # so a device created there is rejected here for up to this many seconds
+    DEVICE_CACHE_NEGATIVE_TTL: float = float(os.getenv("DEVICE_CACHE_NEGATIVE_TTL", "5"))
+
+    # Seconds before in-memory all-time leaderboard totals are rebuilt from the table (0 = only on demand).
+    # Each worker only sees its own ingests between rebuilds.
+    LEADERBOARD_REBUILD_INTERVAL: float = float(os.getenv("LEADERBOARD_REBUILD_INTERVAL", "900"))
+    # Hour/day/week boards re-read readings newer than LEADERBOARD_WINDOW_SETTLE seconds from the
+    # table once they are this old, so they include every worker's ingests
+    LEADERBOARD_WINDOW_TTL: float = float(os.getenv("LEADERBOARD_WINDOW_TTL", "5"))
+    # Older readings are assumed committed and folded into the windows once
+    LEADERBOARD_WINDOW_SETTLE: float = float(os.getenv("LEADERBOARD_WINDOW_SETTLE", "60"))
+    # How long a sorted ranking is shared between readers before it is recomputed
+    LEADERBOARD_RANK_TTL: float = float(os.getenv("LEADERBOARD_RANK_TTL", "2"))
+
+    # Devices whose minute/hour/day rollups are kept in memory (least recently queried or added are dropped)
+    ROLLUP_MAX_DEVICES: int = int(os.getenv("ROLLUP_MAX_DEVICES", "1000"))
+    # Upper bound on points returned by one series query
+    ROLLUP_MAX_POINTS: int = int(os.getenv("ROLLUP_MAX_POINTS", "5000"))
+    # Seconds before a queried device's recent rollups are re-read from the table, picking up
+    # rows written by other workers
+    ROLLUP_REFRESH_INTERVAL: float = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "15"))
+    # Rows older than this are treated as committed and no longer rescanned
+    ROLLUP_SETTLE_SECONDS: float = float(os.getenv("ROLLUP_SETTLE_SECONDS", "120"))
+
+    # Cached owner_id -> username directory for the leaderboard
+    USER_DIRECTORY_REFRESH_INTERVAL: float = float(os.getenv("USER_DIRECTORY_REFRESH_INTERVAL", "300"))
+    USER_DIRECTORY_PAGE_SIZE: int = int(os.getenv("USER_DIRECTORY_PAGE_SIZE", "1000"))
+    USER_DIRECTORY_MISS_TTL: float = float(os.getenv("USER_DIRECTORY_MISS_TTL", "60"))
+
+    # Keyset pagination for /users/data
+    USER_DATA_PAGE_SIZE: int = int(os.getenv("USER_DATA_PAGE_SIZE", "500"))
+    USER_DATA_MAX_PAGE_SIZE: int = int(os.getenv("USER_DATA_MAX_PAGE_SIZE", "5000"))
+
+    # Live telemetry subscriptions: readings a subscriber may fall behind by before it is dropped
+    TELEMETRY_SUBSCRIBER_QUEUE_SIZE: int = int(os.getenv("TELEMETRY_SUBSCRIBER_QUEUE_SIZE", "1000"))
+    TELEMETRY_SUBSCRIBE_KEEPALIVE: float = float(os.getenv("TELEMETRY_SUBSCRIBE_KEEPALIVE", "15"))
+
+    # Comma-separated user ids allowed to use admin endpoints (stats, leaderboard rebuild),
+    # besides users whose app_metadata has role "admin"
+    ADMIN_USER_IDS: str = os.getenv("ADMIN_USER_IDS", "")
+
+    # Request timing middleware; GET /metrics serves Prometheus text format
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
 
 settings = Settings()
@@ -1,4 +1,51 @@
+import threading
+from typing import Optional
+
 from supabase import create_client, Client
 from app.core.config import settings
+from app.core.metrics import traced
+
+# Shared clients, created on first use (not at import) and closed by the app lifespan.
+# Both are wrapped so each query is timed in /metrics.
+_supabase: Optional[Client] = None
+_supabase_admin: Optional[Client] = None
+_lock = threading.Lock()
+
+
+def get_supabase() -> Client:
+    global _supabase
+    if _supabase is None:
+        with _lock:
+            if _supabase is None:
+                _supabase = traced(create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY))
+    return _supabase
+
+
+def get_supabase_admin() -> Client:
+    """Admin client for server-side aggregation (bypasses RLS); needs SUPABASE_SERVICE_ROLE_KEY."""
+    global _supabase_admin
+    if _supabase_admin is None:
+        with _lock:
+            if _supabase_admin is None:
+                _supabase_admin = traced(create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY))
+    return _supabase_admin
+
+
+def set_clients(supabase=None, supabase_admin=None):
+    """Use these clients instead of building real ones, e.g. the in-memory fake in tests and benchmarks."""
+    global _supabase, _supabase_admin
+    with _lock:
+        _supabase = traced(supabase)
+        _supabase_admin = traced(supabase_admin)
+
 
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+def close_clients():
+    global _supabase, _supabase_admin
+    with _lock:
+        for client in (_supabase, _supabase_admin):
+            # The PostgREST session is the only connection pool the sync client keeps open
+            postgrest = getattr(client, "_postgrest", None)
+            if postgrest is not None:
+                postgrest.aclose()
+        _supabase = None
+        _supabase_admin = None
@@ -0,0 +1,77 @@
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.database import get_supabase
+from app.utils.cache import MISSING, TTLCache
+
+
+class DeviceRegistry:
+    """
+    In-process cache of the devices table.
+    Serves device_id -> owner_id and owner_id -> device_ids lookups; unknown
+    device IDs are cached as None for a shorter TTL so bad senders don't hit
+    the database on every reading.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.negative_ttl = negative_ttl
+        self._owners = TTLCache(maxsize, ttl)
+        self._owner_devices = TTLCache(maxsize, ttl)
+
+    def get_owner(self, device_id) -> Optional[str]:
+        return self.get_owners([device_id]).get(str(device_id))
+
+    def get_owners(self, device_ids: Iterable) -> Dict[str, Optional[str]]:
+        """Map each device ID to its owner (None if unknown), querying only the misses in one round-trip."""
+        result: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for device_id in dict.fromkeys(str(d) for d in device_ids):
+            owner = self._owners.get(device_id)
+            if owner is MISSING:
+                missing.append(device_id)
+            else:
+                result[device_id] = owner
+
+        if missing:
+            response = get_supabase().table("devices").select("device_id, owner_id").in_("device_id", missing).execute()
+            found = {str(d["device_id"]): d["owner_id"] for d in response.data or []}
+            for device_id in missing:
+                owner = found.get(device_id)
+                if owner is None:
+                    self._owners.set(device_id, None, ttl=self.negative_ttl)
+                else:
+                    self._owners.set(device_id, owner)
+                result[device_id] = owner
+        return result
+
+    def get_owner_devices(self, owner_id: str) -> List[str]:
+        device_ids = self._owner_devices.get(owner_id)
+        if device_ids is MISSING:
+            response = get_supabase().table("devices").select("device_id").eq("owner_id", owner_id).execute()
+            device_ids = [str(d["device_id"]) for d in response.data or []]
+            self._owner_devices.set(owner_id, device_ids)
+            for device_id in device_ids:
+                self._owners.set(device_id, owner_id)
+        return list(device_ids)
+
+    def register(self, device_id, owner_id: str):
+        self._owners.set(str(device_id), owner_id)
+        self._owner_devices.pop(owner_id)
+
+    def invalidate(self, device_id, owner_id: Optional[str] = None):
+        owner = self._owners.pop(str(device_id))
+        for o in {owner, owner_id} - {None}:
+            self._owner_devices.pop(o)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            "owners": self._owners.stats(),
+            "owner_devices": self._owner_devices.stats(),
+        }
+
+
+device_registry = DeviceRegistry(
+    maxsize=settings.DEVICE_CACHE_SIZE,
+    ttl=settings.DEVICE_CACHE_TTL,
+    negative_ttl=settings.DEVICE_CACHE_NEGATIVE_TTL,
+)
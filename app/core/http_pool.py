@@ -0,0 +1,48 @@
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+# Shared keep-alive pools, created on first use and closed by the app lifespan
+_gemini_client: Optional[httpx.AsyncClient] = None
+_fetch_client: Optional[httpx.AsyncClient] = None
+
+
+def gemini_client() -> httpx.AsyncClient:
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = httpx.AsyncClient(
+            base_url=settings.GEMINI_BASE_URL,
+            headers={"x-goog-api-key": settings.GEMINI_API_KEY},
+            limits=httpx.Limits(
+                max_connections=settings.GEMINI_POOL_SIZE,
+                max_keepalive_connections=settings.GEMINI_POOL_SIZE,
+            ),
+            timeout=httpx.Timeout(settings.GEMINI_READ_TIMEOUT, connect=settings.GEMINI_CONNECT_TIMEOUT),
+        )
+    return _gemini_client
+
+
+def fetch_client() -> httpx.AsyncClient:
+    """Client for fetching user-supplied URLs (e.g. VLM images)."""
+    global _fetch_client
+    if _fetch_client is None:
+        _fetch_client = httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=settings.GEMINI_POOL_SIZE,
+                max_keepalive_connections=settings.GEMINI_POOL_SIZE,
+            ),
+            timeout=httpx.Timeout(settings.IMAGE_FETCH_TIMEOUT, connect=settings.GEMINI_CONNECT_TIMEOUT),
+        )
+    return _fetch_client
+
+
+async def aclose_clients():
+    global _gemini_client, _fetch_client
+    for client in (_gemini_client, _fetch_client):
+        if client is not None:
+            await client.aclose()
+    _gemini_client = None
+    _fetch_client = None
@@ -0,0 +1,165 @@
+import asyncio
+import base64
+import io
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.http_pool import fetch_client
+from app.utils.cache import MISSING, TTLCache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are forwarded unresized
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+class ImageFetchError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class ProcessedImage:
+    mime_type: str
+    data: str  # base64
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def as_part(self) -> Dict:
+        return {"inline_data": {"mime_type": self.mime_type, "data": self.data}}
+
+
+def _downsize(content: bytes, mime_type: str, max_dim: int, quality: int, max_pixels: int) -> tuple[bytes, str]:
+    """Shrink to fit max_dim and re-encode as JPEG, keeping the original if that is smaller."""
+    if Image is None:
+        return content, mime_type
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            # Dimensions come from the header; refuse before decoding so a small file
+            # can't expand into gigabytes of pixels
+            if img.width * img.height > max_pixels:
+                raise ImageFetchError(413, f"Image exceeds {max_pixels} pixels")
+            # JPEGs can be decoded at a reduced scale straight away
+            img.draft("RGB", (max_dim, max_dim))
+            img = ImageOps.exif_transpose(img)
+            resized = max(img.size) > max_dim
+            if resized:
+                img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+    except ImageFetchError:
+        raise
+    except Image.DecompressionBombError as e:
+        raise ImageFetchError(413, f"Image is too large to process: {e}")
+    except Exception as e:
+        logger.info("Could not decode image: %s", e)
+        raise ImageFetchError(400, "image_url does not point to a readable image")
+
+    encoded = out.getvalue()
+    if not resized and len(encoded) >= len(content):
+        return content, mime_type
+    return encoded, "image/jpeg"
+
+
+class ImagePipeline:
+    """
+    Fetches VLM images with a streaming byte cap, downsizes/re-encodes them, and
+    caches the processed result per URL. Cached entries are revalidated with
+    If-None-Match / If-Modified-Since, so unchanged images cost a 304.
+    """
+
+    def __init__(self, max_bytes: int, max_dim: int, quality: int, cache_size: int, cache_ttl: float, max_pixels: int):
+        self.max_bytes = max_bytes
+        self.max_dim = max_dim
+        self.max_pixels = max_pixels
+        self.quality = quality
+        self._cache = TTLCache(cache_size, cache_ttl)
+        self.revalidated = 0
+        self.bytes_fetched = 0
+        self.bytes_sent = 0
+
+    async def fetch(self, url: str) -> ProcessedImage:
+        cached: ProcessedImage | object = self._cache.get(url)
+        headers = {}
+        if cached is not MISSING:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            async with fetch_client().stream("GET", url, headers=headers) as resp:
+                if resp.status_code == 304 and cached is not MISSING:
+                    self.revalidated += 1
+                    self._cache.set(url, cached)
+                    return cached
+                resp.raise_for_status()
+                content = await self._read_capped(resp)
+                mime_type = resp.headers.get("content-type", "image/jpeg").split(";")[0].strip()
+                etag = resp.headers.get("etag")
+                last_modified = resp.headers.get("last-modified")
+        except ImageFetchError:
+            raise
+        except Exception as e:
+            raise ImageFetchError(400, f"Failed to fetch image_url: {e}")
+
+        if not mime_type.startswith("image/"):
+            mime_type = "image/jpeg"
+        if not content:
+            raise ImageFetchError(400, "Image URL returned empty content")
+
+        processed = await asyncio.to_thread(self._process, content, mime_type)
+        processed.etag = etag
+        processed.last_modified = last_modified
+        # Without validators there is no cheap way to tell a changed image apart
+        if etag or last_modified:
+            self._cache.set(url, processed)
+        return processed
+
+    async def _read_capped(self, resp: httpx.Response) -> bytes:
+        declared = resp.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise ImageFetchError(413, f"Image exceeds {self.max_bytes} bytes")
+        chunks = []
+        size = 0
+        async for chunk in resp.aiter_bytes():
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ImageFetchError(413, f"Image exceeds {self.max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _process(self, content: bytes, mime_type: str) -> ProcessedImage:
+        encoded, mime_type = _downsize(content, mime_type, self.max_dim, self.quality, self.max_pixels)
+        self.bytes_fetched += len(content)
+        self.bytes_sent += len(encoded)
+        return ProcessedImage(mime_type=mime_type, data=base64.b64encode(encoded).decode("ascii"))
+
+    def stats(self) -> Dict:
+        return {
+            "cache": self._cache.stats(),
+            "revalidated": self.revalidated,
+            "bytes_fetched": self.bytes_fetched,
+            "bytes_sent": self.bytes_sent,
+            "resizing": Image is not None,
+        }
+
+
+image_pipeline = ImagePipeline(
+    max_bytes=settings.VLM_IMAGE_MAX_BYTES,
+    max_dim=settings.VLM_IMAGE_MAX_DIM,
+    quality=settings.VLM_IMAGE_QUALITY,
+    cache_size=settings.VLM_IMAGE_CACHE_SIZE,
+    cache_ttl=settings.VLM_IMAGE_CACHE_TTL,
+    max_pixels=settings.VLM_IMAGE_MAX_PIXELS,
+)
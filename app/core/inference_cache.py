@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class DiskTier:
+    """
+    Optional on-disk cache tier: one JSON file per key under `root`, evicting the
+    least recently written files once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, root: str, ttl: float, max_bytes: int):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self.root.glob("*/*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text("utf-8"))
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) < time.time():
+            self._remove(path)
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value: str):
+        path = self._path(key)
+        data = json.dumps({"expires_at": time.time() + self.ttl, "value": value})
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(data, "utf-8")
+        with self._lock:
+            old = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+            self._size += len(data.encode("utf-8")) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: Path):
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self._size -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        files = sorted(self.root.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        # Trim to 90% so eviction doesn't run on every write
+        target = self.max_bytes * 0.9
+        for path in files:
+            if self._size <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self._size -= size
+            except OSError:
+                continue
+
+
+class InferenceCache:
+    """
+    Content-addressed cache of model responses with an in-memory LRU tier, an
+    optional disk tier, and coalescing of concurrent identical requests.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_entry_bytes: int, disk: Optional[DiskTier] = None):
+        self.max_entry_bytes = max_entry_bytes
+        self._memory = TTLCache(maxsize, ttl)
+        self._disk = disk
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    @staticmethod
+    def key(model: str, parts: list[dict]) -> str:
+        """Hash of (normalized model, prompt parts); inline images contribute a digest of their bytes."""
+        normalized = []
+        for part in parts:
+            if "inline_data" in part:
+                inline = part["inline_data"]
+                digest = hashlib.sha256(inline["data"].encode("ascii")).hexdigest()
+                normalized.append({"image": inline.get("mime_type"), "sha256": digest})
+            else:
+                normalized.append(part)
+        raw = json.dumps([(model or "").replace("models/", ""), normalized], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._memory.get(key)
+        if value is not MISSING:
+            return value
+        if self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self._memory.set(key, value)
+                return value
+        return None
+
+    async def set(self, key: str, value: str):
+        if self._memory.ttl <= 0 or len(value.encode("utf-8")) > self.max_entry_bytes:
+            return
+        self._memory.set(key, value)
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.set, key, value)
+            except OSError as e:
+                logger.warning("Inference disk cache write failed: %s", e)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller disconnecting doesn't cancel the shared upstream call
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Mark the error as retrieved even if every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        value = await compute()
+        await self.set(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        return {
+            "memory": self._memory.stats(),
+            "disk_enabled": self._disk is not None,
+            "disk_hits": self.disk_hits,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+inference_cache = InferenceCache(
+    maxsize=settings.INFERENCE_CACHE_SIZE,
+    ttl=settings.INFERENCE_CACHE_TTL,
+    max_entry_bytes=settings.INFERENCE_CACHE_MAX_ENTRY_BYTES,
+    disk=DiskTier(
+        settings.INFERENCE_CACHE_DIR,
+        ttl=settings.INFERENCE_CACHE_TTL,
+        max_bytes=settings.INFERENCE_CACHE_DISK_MAX_BYTES,
+    ) if settings.INFERENCE_CACHE_DIR else None,
+)
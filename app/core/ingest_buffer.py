@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE classes for rows the database rejects outright (bad data, constraint
+# violations, unknown columns); retrying the same rows cannot succeed
+_PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+def _is_transient(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return not (isinstance(code, str) and code[:2] in _PERMANENT_SQLSTATE_CLASSES)
+
+
+class IngestBufferFull(Exception):
+    pass
+
+
+class IngestBuffer:
+    """
+    Bounded in-process write-behind queue for telemetry rows.
+    A background thread coalesces queued rows into bulk inserts once
+    `flush_rows` are waiting or `flush_interval` seconds have passed.
+    A batch the database rejects is split in half until the bad rows are
+    isolated; rows that still can't be written are appended to `dead_letter_path`
+    (JSON lines) so they can be inspected and replayed.
+    `flush_fn` must only write: any exception is taken to mean the rows were not
+    stored. Work that depends on stored rows goes in `on_flushed`, whose failures
+    are logged and never retried.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Dict]], object],
+        max_rows: int,
+        flush_rows: int,
+        flush_interval: float,
+        max_retries: int = 3,
+        dead_letter_path: str = "",
+        on_flushed: Optional[Callable[[List[Dict]], object]] = None,
+    ):
+        self._flush_fn = flush_fn
+        self._on_flushed = on_flushed
+        self._max_rows = max_rows
+        self._flush_rows = flush_rows
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._dead_letter_path = Path(dead_letter_path) if dead_letter_path else None
+
+        self._rows: deque = deque()
+        # Batch taken off the queue that the flusher is still writing
+        self._flushing: List[Dict] = []
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Stop the flusher, writing out everything still queued."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, rows: List[Dict]):
+        """Queue rows for writing. All-or-nothing: raises IngestBufferFull if they don't fit."""
+        with self._cond:
+            if self._stopping or len(self._rows) + len(rows) > self._max_rows:
+                self.rejected += len(rows)
+                raise IngestBufferFull()
+            self._rows.extend(rows)
+            self.accepted += len(rows)
+            if len(self._rows) >= self._flush_rows:
+                self._cond.notify()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "queued": len(self._rows),
+                "capacity": self._max_rows,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+            }
+
+    def pending_rows(self) -> List[Dict]:
+        """Rows accepted but not yet stored or dropped: queued plus the batch being written."""
+        with self._cond:
+            return list(self._flushing) + list(self._rows)
+
+    def dead_letter_rows(self) -> Iterator[Dict]:
+        """Rows in the dead-letter file, kept until someone replays or deletes them."""
+        if self._dead_letter_path is None or not self._dead_letter_path.exists():
+            return
+        with self._dead_letter_path.open() as f:
+            for line in f:
+                try:
+                    yield json.loads(line)["row"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def _take(self) -> List[Dict]:
+        count = min(len(self._rows), self._flush_rows)
+        return [self._rows.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self._flush_interval
+                while not self._stopping and len(self._rows) < self._flush_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take()
+                self._flushing = batch
+                done = self._stopping and not batch
+
+            if done:
+                return
+            if batch:
+                self._write(batch)
+                with self._cond:
+                    self._flushing = []
+
+    def _write(self, batch: List[Dict]):
+        for attempt in range(1, self._max_retries + 1):
+            try:
+                self._flush_fn(batch)
+            except Exception as e:
+                if not _is_transient(e):
+                    self._isolate(batch, e)
+                    return
+                logger.warning("Telemetry flush of %d rows failed (attempt %d): %s", len(batch), attempt, e)
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+                continue
+            with self._cond:
+                self.flushed += len(batch)
+            if self._on_flushed is not None:
+                try:
+                    self._on_flushed(batch)
+                except Exception:
+                    logger.exception("Post-flush handler failed for %d stored telemetry rows", len(batch))
+            return
+        self._drop(batch, f"{self._max_retries} failed flushes")
+
+    def _isolate(self, batch: List[Dict], error: Exception):
+        # One bad row fails the whole insert; bisect so the rest still get written
+        if len(batch) == 1:
+            self._drop(batch, str(error))
+            return
+        middle = len(batch) // 2
+        self._write(batch[:middle])
+        self._write(batch[middle:])
+
+    def _drop(self, batch: List[Dict], reason: str):
+        logger.error(
+            "Dropping %d telemetry rows (%s): telemetry_ids %s",
+            len(batch), reason, [row.get("telemetry_id") for row in batch],
+        )
+        if self._dead_letter_path is not None:
+            try:
+                self._dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+                with self._dead_letter_path.open("a") as f:
+                    for row in batch:
+                        f.write(json.dumps({"reason": reason, "row": row}, default=str) + "\n")
+            except OSError as e:
+                logger.error("Could not write dead-letter file %s: %s", self._dead_letter_path, e)
+        with self._cond:
+            self.dropped += len(batch)
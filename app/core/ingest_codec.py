@@ -0,0 +1,178 @@
+"""
+Compact ingest encodings, negotiated per request:
+
+  Content-Encoding: gzip | zstd        (stacked encodings are undone in reverse order)
+  Content-Type: application/json       the usual JSON bodies
+                application/msgpack    the same shapes as JSON, MessagePack-encoded
+                application/x-telemetry-frame
+                                       fixed 24-byte little-endian frames "<Qdd":
+                                       device_id, timestamp (epoch seconds, 0 = now), value
+
+Binary bodies are decoded into the objects the JSON endpoints expect and handed to
+the unchanged route, so they share the same validation and insert path.
+"""
+import struct
+import zlib
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    try:
+        import zstandard
+    except ImportError:  # zstd bodies are rejected with 415 without either module
+        zstandard = None
+    zstd = None
+
+try:
+    import msgpack
+except ImportError:  # optional: pip install msgpack (the "ingest" extra)
+    msgpack = None
+
+FRAME = struct.Struct("<Qdd")
+FRAME_CONTENT_TYPE = "application/x-telemetry-frame"
+MSGPACK_CONTENT_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"Request body exceeds {settings.INGEST_MAX_BODY_BYTES} bytes")
+
+
+def _gunzip(body: bytes, limit: int) -> bytes:
+    decoder = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    data = decoder.decompress(body, limit + 1)
+    if len(data) > limit:
+        raise _too_large()
+    if not decoder.eof:
+        raise ValueError("truncated gzip stream")
+    return data
+
+
+def _unzstd(body: bytes, limit: int) -> bytes:
+    if zstd is not None:
+        data = zstd.ZstdDecompressor().decompress(body, max_length=limit + 1)
+    elif zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(body)
+        chunks, size = [], 0
+        while size <= limit:
+            chunk = reader.read(min(1 << 20, limit + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        data = b"".join(chunks)
+    else:
+        raise HTTPException(status_code=415, detail="zstd request bodies are not supported on this server")
+    if len(data) > limit:
+        raise _too_large()
+    return data
+
+
+DECODERS: Dict[str, Callable[[bytes, int], bytes]] = {
+    "gzip": _gunzip,
+    "x-gzip": _gunzip,
+    "zstd": _unzstd,
+}
+
+
+def decompress(body: bytes, content_encoding: str) -> bytes:
+    encodings = [e.strip().lower() for e in content_encoding.split(",") if e.strip()]
+    for encoding in reversed(encodings):
+        if encoding == "identity":
+            continue
+        decoder = DECODERS.get(encoding)
+        if decoder is None:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+        try:
+            body = decoder(body, settings.INGEST_MAX_BODY_BYTES)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+    return body
+
+
+def decode_frames(body: bytes) -> List[Dict[str, Any]]:
+    """Unpack fixed frames into batch items: {"device_id": ..., "payload": {...}}."""
+    if len(body) % FRAME.size:
+        raise HTTPException(status_code=400, detail=f"Frame body must be a multiple of {FRAME.size} bytes")
+    items = []
+    for device_id, timestamp, value in FRAME.iter_unpack(body):
+        payload = {"potentiometer_value": value}
+        if timestamp:
+            payload["timestamp"] = timestamp
+        items.append({"device_id": device_id, "payload": payload})
+    return items
+
+
+def frame_payloads(items: List[Dict[str, Any]], device_id: str) -> List[Dict[str, Any]]:
+    """Payloads of frames addressed to `device_id` (a zero device_id means "this device")."""
+    for item in items:
+        if item["device_id"] and str(item["device_id"]) != device_id:
+            raise HTTPException(status_code=400, detail=f"Frame device_id {item['device_id']} does not match the URL")
+    return [item["payload"] for item in items]
+
+
+def _frames_for_route(items: List[Dict[str, Any]], path: str, path_device_id: Optional[str]) -> Any:
+    # /ingest/batch takes items as-is; the per-device routes take bare payloads
+    if path_device_id is None:
+        return items
+    payloads = frame_payloads(items, path_device_id)
+    if path.endswith("/batch"):
+        return payloads
+    if len(payloads) != 1:
+        raise HTTPException(status_code=400, detail="Expected exactly one frame")
+    return payloads[0]
+
+
+def _decode_msgpack(body: bytes) -> Any:
+    if msgpack is None:
+        raise HTTPException(status_code=415, detail="MessagePack bodies are not supported on this server")
+    try:
+        # timestamp=3 turns msgpack timestamps into datetimes
+        return msgpack.unpackb(body, raw=False, timestamp=3)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid MessagePack body: {e}")
+
+
+class IngestRoute(APIRoute):
+    """APIRoute that decompresses and decodes binary bodies before FastAPI parses them as JSON."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def decoding_handler(request: Request) -> Response:
+            content_encoding = request.headers.get("content-encoding", "")
+            content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+            binary = content_type == FRAME_CONTENT_TYPE or content_type in MSGPACK_CONTENT_TYPES
+            if not content_encoding and not binary:
+                return await handler(request)
+
+            body = await request.body()
+            if len(body) > settings.INGEST_MAX_BODY_BYTES:
+                raise _too_large()
+            if content_encoding:
+                body = decompress(body, content_encoding)
+
+            # Hand FastAPI a JSON request whose body and parsed value are already cached
+            scope = dict(request.scope)
+            scope["headers"] = [
+                (k, v) for k, v in request.scope["headers"]
+                if k not in (b"content-encoding", b"content-type", b"content-length")
+            ] + [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            decoded = Request(scope, request.receive)
+            decoded._body = body
+            if content_type == FRAME_CONTENT_TYPE:
+                decoded._json = _frames_for_route(decode_frames(body), self.path, request.path_params.get("device_id"))
+            elif binary:
+                decoded._json = _decode_msgpack(body)
+            elif content_type and content_type != "application/json" and not content_type.endswith("+json"):
+                raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {content_type}")
+            return await handler(decoded)
+
+        return decoding_handler
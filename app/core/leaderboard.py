@@ -0,0 +1,336 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import get_supabase_admin
+from app.core.telemetry_scan import scan_telemetry
+from app.utils.scoring import group_score_totals, score_value, score_values, to_value_array
+
+logger = logging.getLogger(__name__)
+
+# Only the reading is needed, so the JSONB payload (and any image) is never downloaded
+SCAN_COLUMNS = "device_id, created_at, potentiometer_value:payload->potentiometer_value"
+# Scanned readings are scored in vectorized chunks of this many rows
+REBUILD_CHUNK_ROWS = 50000
+# A reading can reach add() this long after its created_at (write-behind queueing
+# and retries). The rebuild remembers which recent rows it scanned so readings
+# ingested during the scan are counted exactly once.
+PENDING_HORIZON = 300
+
+# Sliding windows: (length, bucket size) in seconds. Expiry is per bucket,
+# so a window may include up to one extra bucket of older readings.
+WINDOWS: Dict[str, Tuple[int, int]] = {
+    "hour": (3600, 60),
+    "day": (86400, 900),
+    "week": (7 * 86400, 3600),
+}
+ALL_TIME = "all"
+
+
+class SlidingWindow:
+    """Per-user score sums over the last `length` seconds, kept as time buckets."""
+
+    def __init__(self, length: int, bucket: int):
+        self.length = length
+        self.bucket = bucket
+        self._buckets: Dict[int, Dict[str, List[float]]] = {}
+        self.totals: Dict[str, List[float]] = {}
+
+    def add(self, owner_id: str, score: float, created_at: int, now: float):
+        if created_at < now - self.length:
+            return
+        start = created_at - created_at % self.bucket
+        entry = self._buckets.setdefault(start, {}).setdefault(owner_id, [0.0, 0])
+        entry[0] += score
+        entry[1] += 1
+        totals = self.totals.setdefault(owner_id, [0.0, 0])
+        totals[0] += score
+        totals[1] += 1
+
+    def expire(self, now: float):
+        cutoff = now - self.length
+        for start in [s for s in self._buckets if s + self.bucket <= cutoff]:
+            for owner_id, (total, count) in self._buckets.pop(start).items():
+                totals = self.totals[owner_id]
+                totals[0] -= total
+                totals[1] -= count
+                if totals[1] <= 0:
+                    del self.totals[owner_id]
+
+
+@dataclass
+class Ranking:
+    """A sorted snapshot of one leaderboard, shared by readers until it goes stale."""
+    entries: List[Tuple[str, float]] = field(default_factory=list)
+    positions: Dict[str, int] = field(default_factory=dict)
+    built_at: float = 0.0
+
+
+def _device_owners(client) -> Dict[str, Optional[str]]:
+    devices = client.table("devices").select("device_id, owner_id").execute().data or []
+    return {str(d["device_id"]): d["owner_id"] for d in devices}
+
+
+def _new_windows() -> Dict[str, SlidingWindow]:
+    return {name: SlidingWindow(length, bucket) for name, (length, bucket) in WINDOWS.items()}
+
+
+class Leaderboard:
+    """
+    Per-user running aggregates (sum of per-record scores, record count), all-time
+    and over sliding hour/day/week windows, so ranking costs O(users) instead of a
+    full telemetry scan. All-time totals are updated on every ingest and rebuilt
+    from the telemetry table on demand. Windows are read from the table: readings
+    older than `window_settle` seconds are kept in `_windows`, newer ones are
+    rescanned into `_window_tail` once it is `window_ttl` old, so every worker
+    sees the same windows. Sorted rankings are cached for LEADERBOARD_RANK_TTL.
+    """
+
+    def __init__(self, rebuild_interval: float, rank_ttl: float, window_ttl: float, window_settle: float):
+        self.rebuild_interval = rebuild_interval
+        self.rank_ttl = rank_ttl
+        self.window_ttl = window_ttl
+        self.window_settle = window_settle
+        self._totals: Dict[str, List[float]] = {}
+        self._windows = _new_windows()
+        self._window_tail = _new_windows()
+        self._window_settled_until: Optional[int] = None
+        self._windows_at: Optional[float] = None
+        self._windows_refreshing = False
+        self._rankings: Dict[str, Ranking] = {}
+        self._lock = threading.Lock()
+        self._rebuilt = threading.Condition(self._lock)
+        self._windows_refreshed = threading.Condition(self._lock)
+        self._built_at: Optional[float] = None
+        self._rebuilding = False
+        # Rows ingested while a rebuild scan is running: telemetry_id -> (owner_id, score, created_at)
+        self._pending: Dict[int, Tuple[str, float, int]] = {}
+
+    def add(self, owner_id: str, value, telemetry_id: int, created_at: int):
+        score = score_value(value)
+        if score is None:
+            return
+        with self._lock:
+            totals = self._totals.setdefault(owner_id, [0.0, 0])
+            totals[0] += score
+            totals[1] += 1
+            if self._rebuilding:
+                self._pending[telemetry_id] = (owner_id, score, created_at)
+
+    def add_rows(self, rows: Iterable[Dict], owners: Dict[str, Optional[str]]):
+        for row in rows:
+            owner_id = owners.get(str(row["device_id"]))
+            if owner_id:
+                self.add(owner_id, row["payload"].get("potentiometer_value"), row["telemetry_id"], row["created_at"])
+
+    def rebuild(self, wait: bool = False):
+        """
+        Recompute every user's aggregates with a paged scan of the telemetry table.
+        If a rebuild is already running this returns at once, or with `wait` blocks
+        until it has finished (and takes over if it failed).
+        """
+        with self._lock:
+            built_at = self._built_at
+            while self._rebuilding:
+                if not wait:
+                    return
+                self._rebuilt.wait()
+                if self._built_at != built_at:
+                    return
+            self._rebuilding = True
+            self._pending = {}
+        # IDs of scanned rows recent enough to also be in _pending
+        seen = set()
+        horizon = time.time() - PENDING_HORIZON
+        try:
+            client = get_supabase_admin()
+            device_owner_map = _device_owners(client)
+
+            totals: Dict[str, List[float]] = {}
+            owners: List[str] = []
+            values: List = []
+            for row in scan_telemetry(client, SCAN_COLUMNS):
+                if row["created_at"] >= horizon:
+                    seen.add(row["telemetry_id"])
+                owner_id = device_owner_map.get(str(row["device_id"]))
+                if not owner_id:
+                    continue
+                owners.append(owner_id)
+                values.append(row.get("potentiometer_value"))
+                if len(owners) >= REBUILD_CHUNK_ROWS:
+                    self._merge_chunk(totals, owners, values)
+                    owners, values = [], []
+            self._merge_chunk(totals, owners, values)
+        except Exception:
+            with self._lock:
+                self._rebuilding = False
+                self._pending = {}
+                self._rebuilt.notify_all()
+            raise
+
+        with self._lock:
+            # Readings ingested during the scan that it did not see. Older stragglers
+            # can't be told apart, so they wait for the next rebuild rather than risk
+            # being counted twice.
+            for telemetry_id, (owner_id, score, created_at) in self._pending.items():
+                if telemetry_id not in seen and created_at >= horizon:
+                    entry = totals.setdefault(owner_id, [0.0, 0])
+                    entry[0] += score
+                    entry[1] += 1
+            self._totals = totals
+            self._rankings = {}
+            self._pending = {}
+            self._rebuilding = False
+            self._built_at = time.monotonic()
+            self._rebuilt.notify_all()
+
+    @staticmethod
+    def _merge_chunk(totals: Dict[str, List[float]], owners: List[str], values: List):
+        for owner_id, (total, count) in group_score_totals(score_values(to_value_array(values)), owners).items():
+            if count:
+                entry = totals.setdefault(owner_id, [0.0, 0])
+                entry[0] += total
+                entry[1] += count
+
+    def _ensure_windows(self):
+        """Refresh the windows when stale; one caller scans while the others keep the current ones."""
+        with self._lock:
+            while True:
+                if self._windows_at is not None and (
+                    self._windows_refreshing or time.monotonic() - self._windows_at < self.window_ttl
+                ):
+                    return
+                if not self._windows_refreshing:
+                    break
+                # Nothing to serve yet, wait for the first refresh (or take over if it failed)
+                self._windows_refreshed.wait()
+            self._windows_refreshing = True
+            first = self._windows_at is None
+        try:
+            self._refresh_windows()
+        except Exception as e:
+            if first:
+                raise
+            logger.warning("Leaderboard window refresh failed: %s", e)
+        finally:
+            with self._lock:
+                self._windows_refreshing = False
+                self._windows_refreshed.notify_all()
+
+    def _refresh_windows(self):
+        now = time.time()
+        since = self._window_settled_until
+        if since is None:
+            since = int(now - max(length for length, _ in WINDOWS.values()))
+        settled_until = max(since, int(now - self.window_settle))
+
+        settled: List[Tuple[str, float, int]] = []
+        tail = _new_windows()
+        client = get_supabase_admin()
+        # One devices select, like rebuild(); an IN list per chunk would not fit in a URL
+        owners = _device_owners(client)
+        rows = list(scan_telemetry(client, SCAN_COLUMNS, since=since))
+        for start in range(0, len(rows), REBUILD_CHUNK_ROWS):
+            chunk = rows[start:start + REBUILD_CHUNK_ROWS]
+            scores = score_values(to_value_array([row.get("potentiometer_value") for row in chunk]))
+            for row, score in zip(chunk, scores.tolist()):
+                owner_id = owners.get(str(row["device_id"]))
+                if not owner_id or score != score:  # NaN: no valid reading
+                    continue
+                if row["created_at"] < settled_until:
+                    settled.append((owner_id, score, row["created_at"]))
+                else:
+                    for window in tail.values():
+                        window.add(owner_id, score, row["created_at"], now)
+
+        with self._lock:
+            for owner_id, score, created_at in settled:
+                for window in self._windows.values():
+                    window.add(owner_id, score, created_at, now)
+            self._window_tail = tail
+            self._window_settled_until = settled_until
+            self._windows_at = time.monotonic()
+            for name in WINDOWS:
+                self._rankings.pop(name, None)
+
+    def _window_totals(self, window: str) -> Dict[str, List[float]]:
+        now = time.time()
+        totals: Dict[str, List[float]] = {}
+        for part in (self._windows[window], self._window_tail[window]):
+            part.expire(now)
+            for owner_id, (total, count) in part.totals.items():
+                entry = totals.setdefault(owner_id, [0.0, 0])
+                entry[0] += total
+                entry[1] += count
+        return totals
+
+    def ensure_fresh(self):
+        """Build synchronously on first use; afterwards refresh stale aggregates in the background."""
+        if self._built_at is None:
+            # Concurrent first callers wait for the same build instead of serving an empty board
+            self.rebuild(wait=True)
+        elif self.rebuild_interval and time.monotonic() - self._built_at > self.rebuild_interval:
+            if not self._rebuilding:
+                threading.Thread(target=self._rebuild_quietly, name="leaderboard-rebuild", daemon=True).start()
+
+    def _rebuild_quietly(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.warning("Leaderboard rebuild failed: %s", e)
+
+    def ranking(self, window: str = ALL_TIME) -> Ranking:
+        """Sorted (owner_id, score) pairs for a window, score being the rounded average record score."""
+        ranking = self._rankings.get(window)
+        if ranking is not None and time.monotonic() - ranking.built_at < self.rank_ttl:
+            return ranking
+
+        if window != ALL_TIME:
+            self._ensure_windows()
+        with self._lock:
+            totals = self._totals if window == ALL_TIME else self._window_totals(window)
+            scores = [(owner_id, round(total / count, 2)) for owner_id, (total, count) in totals.items()]
+        # Ties are broken by owner_id so pages stay stable between refreshes
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        ranking = Ranking(
+            entries=scores,
+            positions={owner_id: i for i, (owner_id, _) in enumerate(scores)},
+            built_at=time.monotonic(),
+        )
+        self._rankings[window] = ranking
+        return ranking
+
+    def page(self, window: str, offset: int, limit: int) -> List[Tuple[int, str, float]]:
+        """(rank, owner_id, score) for ranks offset+1 .. offset+limit."""
+        entries = self.ranking(window).entries[offset:offset + limit]
+        return [(offset + i + 1, owner_id, score) for i, (owner_id, score) in enumerate(entries)]
+
+    def rank_of(self, owner_id: str, window: str = ALL_TIME) -> Optional[Tuple[int, float, int]]:
+        """(rank, score, number of ranked users) for one user, or None if they have no records."""
+        ranking = self.ranking(window)
+        position = ranking.positions.get(owner_id)
+        if position is None:
+            return None
+        return position + 1, ranking.entries[position][1], len(ranking.entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._totals),
+                "records": sum(count for _, count in self._totals.values()),
+                "window_users": {name: len(self._window_totals(name)) for name in WINDOWS},
+                "rebuilding": self._rebuilding,
+                "age_seconds": None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+                "windows_age_seconds": None if self._windows_at is None else round(time.monotonic() - self._windows_at, 1),
+            }
+
+
+leaderboard = Leaderboard(
+    rebuild_interval=settings.LEADERBOARD_REBUILD_INTERVAL,
+    rank_ttl=settings.LEADERBOARD_RANK_TTL,
+    window_ttl=settings.LEADERBOARD_WINDOW_TTL,
+    window_settle=settings.LEADERBOARD_WINDOW_SETTLE,
+)
@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+# Upstream statuses that say "try another model" rather than "this request is bad"
+FALLTHROUGH_STATUSES = {404, 429, 503}
+
+
+@dataclass
+class ModelHealth:
+    successes: int = 0
+    failures: int = 0
+    not_found: int = 0
+    consecutive_failures: int = 0
+    hedge_losses: int = 0
+    latency_ewma: Optional[float] = None
+    open_until: float = 0.0
+    last_status: Optional[int] = None
+    # A call is in flight on a half-open circuit; others skip the model until it reports back
+    probing: bool = False
+
+    def half_open(self, now: float) -> bool:
+        return 0 < self.open_until <= now
+
+    def as_dict(self, now: float) -> Dict:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "not_found": self.not_found,
+            "consecutive_failures": self.consecutive_failures,
+            "hedge_losses": self.hedge_losses,
+            "latency_ewma_ms": None if self.latency_ewma is None else round(self.latency_ewma * 1000, 1),
+            "circuit_open": self.open_until > now,
+            "open_for_seconds": max(0.0, round(self.open_until - now, 1)),
+            "probing": self.probing,
+            "last_status": self.last_status,
+        }
+
+
+class ModelRouter:
+    """
+    Remembers per-model health across requests. Models that return 404 or keep
+    failing with 429/5xx get an open circuit and are skipped until a cooldown
+    passes. After that the circuit is half-open: a single call is let through
+    as a probe, and its outcome closes or reopens the circuit.
+    Requested model names come from clients, so only the `max_models` most
+    recently used are remembered; the fallback models are used by every request
+    and never age out.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        cooldown: float,
+        not_found_cooldown: float,
+        ewma_alpha: float,
+        max_models: int = 64,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.not_found_cooldown = not_found_cooldown
+        self.ewma_alpha = ewma_alpha
+        self.max_models = max_models
+        self._health: "OrderedDict[str, ModelHealth]" = OrderedDict()
+
+    def _get(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth()
+            while len(self._health) > self.max_models:
+                self._health.popitem(last=False)
+        else:
+            self._health.move_to_end(model)
+        return health
+
+    def _available(self, health: ModelHealth, now: float) -> bool:
+        return health.open_until <= now and not health.probing
+
+    def order(self, models: List[str]) -> List[str]:
+        """Models in preference order with open circuits skipped (all of them if every circuit is open)."""
+        now = time.monotonic()
+        available = [m for m in models if self._available(self._get(m), now)]
+        return available or list(models)
+
+    def begin(self, model: str) -> bool:
+        """
+        Call right before sending a request to `model`. Returns False if the circuit
+        is half-open and another request is already probing it; otherwise the call
+        may go ahead and must be finished with record_success, record_failure,
+        record_hedge_loss or release.
+        """
+        health = self._get(model)
+        if health.half_open(time.monotonic()):
+            if health.probing:
+                return False
+            health.probing = True
+        return True
+
+    def release(self, model: str):
+        """The call ended without telling us anything about the model (e.g. the client went away)."""
+        self._get(model).probing = False
+
+    def _observe_latency(self, health: ModelHealth, latency: float):
+        if health.latency_ewma is None:
+            health.latency_ewma = latency
+        else:
+            health.latency_ewma += self.ewma_alpha * (latency - health.latency_ewma)
+
+    def record_success(self, model: str, latency: float):
+        health = self._get(model)
+        health.probing = False
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.open_until = 0.0
+        health.last_status = 200
+        self._observe_latency(health, latency)
+
+    def record_hedge_loss(self, model: str, elapsed: float):
+        """A call cancelled because a hedged call won; its elapsed time is a lower bound on latency."""
+        health = self._get(model)
+        health.probing = False
+        health.hedge_losses += 1
+        self._observe_latency(health, elapsed)
+
+    def record_failure(self, model: str, status_code: int):
+        health = self._get(model)
+        health.probing = False
+        health.last_status = status_code
+        if status_code == 404:
+            health.not_found += 1
+            health.open_until = time.monotonic() + self.not_found_cooldown
+            return
+        if status_code != 429 and status_code < 500:
+            # The request was rejected, not the model
+            return
+        health.failures += 1
+        health.consecutive_failures += 1
+        if health.consecutive_failures >= self.failure_threshold:
+            health.open_until = time.monotonic() + self.cooldown
+
+    def stats(self) -> Dict[str, Dict]:
+        now = time.monotonic()
+        return {model: health.as_dict(now) for model, health in self._health.items()}
+
+
+model_router = ModelRouter(
+    failure_threshold=settings.MODEL_FAILURE_THRESHOLD,
+    cooldown=settings.MODEL_COOLDOWN,
+    not_found_cooldown=settings.MODEL_NOT_FOUND_COOLDOWN,
+    ewma_alpha=settings.MODEL_LATENCY_EWMA_ALPHA,
+)
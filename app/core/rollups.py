@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.database import get_supabase_admin
+from app.core.telemetry_scan import scan_telemetry
+from app.utils.scoring import score_values, to_value_array
+
+# Bucket size in seconds and how long buckets are kept at that resolution
+RESOLUTIONS: Dict[str, int] = {"minute": 60, "hour": 3600, "day": 86400}
+RETENTION: Dict[str, int] = {"minute": 2 * 86400, "hour": 90 * 86400, "day": 5 * 365 * 86400}
+
+logger = logging.getLogger(__name__)
+
+SCAN_COLUMNS = "created_at, potentiometer_value:payload->potentiometer_value"
+
+
+class Bucket:
+    __slots__ = ("count", "min", "max", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "Bucket"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+
+def _empty_series() -> Dict[str, Dict[int, Bucket]]:
+    return {name: {} for name in RESOLUTIONS}
+
+
+def _add(series: Dict[str, Dict[int, Bucket]], value: float, created_at: int, now: float):
+    for name, size in RESOLUTIONS.items():
+        if created_at < now - RETENTION[name]:
+            continue
+        buckets = series[name]
+        start = created_at - created_at % size
+        bucket = buckets.get(start)
+        if bucket is None:
+            bucket = buckets[start] = Bucket()
+            if len(buckets) > RETENTION[name] // size * 1.1:
+                _prune(buckets, now - RETENTION[name])
+        bucket.add(value)
+
+
+def _prune(buckets: Dict[int, Bucket], cutoff: float):
+    for start in [s for s in buckets if s < cutoff]:
+        del buckets[start]
+
+
+class DeviceRollups:
+    """
+    Rows created before `settled_until` are folded into `base` once and never
+    rescanned. Newer rows live in `tail`, which each refresh rebuilds from the
+    table so rows written by other workers show up. Rows before `loaded_from`
+    haven't been read yet; queries reaching back further extend `base`.
+    """
+
+    def __init__(self, loaded_from: int):
+        self.base = _empty_series()
+        self.tail = _empty_series()
+        self.loaded_from = loaded_from
+        self.settled_until = loaded_from
+        # Serializes backward extensions so a range is never scanned twice
+        self.extend_lock = threading.Lock()
+        # Rows ingested by this process and not yet settled: telemetry_id -> (created_at, value)
+        self.live: Dict[int, tuple] = {}
+        self.refreshed_at = 0.0
+        self.refreshing = False
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class RollupStore:
+    """
+    Per-device count/min/max/mean of potentiometer readings at minute, hour and
+    day resolution. A device's series start when it first ingests here or is first
+    queried, are updated at ingest, and are refreshed from the table when older than
+    ROLLUP_REFRESH_INTERVAL. Older history is backfilled from the table only as far
+    back as queries ask for, bounded by the queried resolution's retention.
+    Rows are assumed committed within ROLLUP_SETTLE_SECONDS of their created_at;
+    later commits are missed.
+    """
+
+    def __init__(self, max_devices: int, refresh_interval: float, settle_seconds: float):
+        self.max_devices = max_devices
+        self.refresh_interval = refresh_interval
+        self.settle_seconds = settle_seconds
+        self._devices: "OrderedDict[str, DeviceRollups]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_rows(self, rows: Iterable[Dict]):
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                value = row["payload"].get("potentiometer_value")
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                device = self._devices.get(str(row["device_id"]))
+                if device is None:
+                    # Start the series here; earlier rows are backfilled if a query asks for them
+                    device = self._new_device(str(row["device_id"]), row["created_at"])
+                    device.ready.set()
+                if row["created_at"] < device.settled_until:
+                    continue
+                device.live[row["telemetry_id"]] = (row["created_at"], value)
+                _add(device.tail, value, row["created_at"], now)
+
+    def _new_device(self, device_id: str, loaded_from: int) -> DeviceRollups:
+        device = self._devices[device_id] = DeviceRollups(loaded_from)
+        while len(self._devices) > self.max_devices:
+            self._devices.popitem(last=False)
+        return device
+
+    def _load(self, device_id: str, since: int) -> DeviceRollups:
+        """The device's series, covering at least rows created at or after `since`."""
+        now = time.time()
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is not None:
+                self._devices.move_to_end(device_id)
+                owner = False
+                # One caller refreshes a stale device, the rest keep reading the current series
+                refresh = (
+                    device.ready.is_set()
+                    and not device.refreshing
+                    and now - device.refreshed_at >= self.refresh_interval
+                )
+                if refresh:
+                    device.refreshing = True
+            else:
+                device = self._new_device(device_id, since)
+                device.refreshing = owner = True
+
+        if owner:
+            try:
+                self._refresh(device_id, device)
+            except BaseException as e:
+                with self._lock:
+                    if self._devices.get(device_id) is device:
+                        del self._devices[device_id]
+                device.error = e
+                raise
+            finally:
+                device.ready.set()
+        elif refresh:
+            try:
+                self._refresh(device_id, device)
+            except Exception as e:
+                # Keep serving the previous series, the next query retries
+                logger.warning("Rollup refresh for device %s failed: %s", device_id, e)
+                with self._lock:
+                    device.refreshing = False
+        else:
+            device.ready.wait()
+            if device.error is not None:
+                raise device.error
+        if since < device.loaded_from:
+            self._extend(device_id, device, since)
+        return device
+
+    def _extend(self, device_id: str, device: DeviceRollups, since: int):
+        """Fold rows created in [since, loaded_from) into base; they are all settled."""
+        with device.extend_lock:
+            until = device.loaded_from
+            if since >= until:
+                return
+            scanned = list(scan_telemetry(
+                get_supabase_admin(), SCAN_COLUMNS, since=since, until=until, device_ids=[device_id],
+            ))
+            values = to_value_array([row.get("potentiometer_value") for row in scanned])
+            now = time.time()
+            with self._lock:
+                for row, value in zip(scanned, values.tolist()):
+                    if value == value:  # skip NaN
+                        _add(device.base, value, row["created_at"], now)
+                device.loaded_from = since
+
+    def _refresh(self, device_id: str, device: DeviceRollups):
+        now = time.time()
+        settled_until = max(device.settled_until, int(now - self.settle_seconds))
+        scanned = list(scan_telemetry(
+            get_supabase_admin(), SCAN_COLUMNS, since=device.settled_until, device_ids=[device_id],
+        ))
+        values = to_value_array([row.get("potentiometer_value") for row in scanned])
+        tail = _empty_series()
+        with self._lock:
+            for row, value in zip(scanned, values.tolist()):
+                if value == value:  # skip NaN
+                    created_at = row["created_at"]
+                    _add(device.base if created_at < settled_until else tail, value, created_at, now)
+            # Readings ingested here that the scan did not see (not committed yet)
+            seen = {row["telemetry_id"] for row in scanned}
+            live = {}
+            for telemetry_id, (created_at, value) in device.live.items():
+                if telemetry_id in seen:
+                    continue
+                if created_at < settled_until:
+                    _add(device.base, value, created_at, now)
+                else:
+                    _add(tail, value, created_at, now)
+                    live[telemetry_id] = (created_at, value)
+            device.tail = tail
+            device.live = live
+            device.settled_until = settled_until
+            device.refreshed_at = now
+            device.refreshing = False
+
+    def query(self, device_id, resolution: str, start: int, end: int) -> List[Dict]:
+        """Non-empty buckets with start <= t < end, oldest first."""
+        size = RESOLUTIONS[resolution]
+        lo = start - start % size
+        now = int(time.time())
+        # Nothing older than the resolution's retention is kept, so never load it
+        device = self._load(str(device_id), min(max(lo, now - RETENTION[resolution]), now))
+        with self._lock:
+            buckets: Dict[int, Bucket] = {}
+            for series in (device.base, device.tail):
+                for t, b in series[resolution].items():
+                    if lo <= t < end and b.count > 0:
+                        buckets.setdefault(t, Bucket()).merge(b)
+            points = sorted((t, b.count, b.min, b.max, b.total) for t, b in buckets.items())
+        means = [total / count for _, count, _, _, total in points]
+        mean_scores = score_values(means).tolist() if points else []
+        return [
+            {
+                "t": t,
+                "count": count,
+                "min": min_value,
+                "max": max_value,
+                "mean": round(mean, 4),
+                "mean_score": round(mean_score, 4),
+            }
+            for (t, count, min_value, max_value, _), mean, mean_score in zip(points, means, mean_scores)
+        ]
+
+    def forget(self, device_id):
+        with self._lock:
+            self._devices.pop(str(device_id), None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "max_devices": self.max_devices,
+                "buckets": sum(
+                    len(buckets)
+                    for device in self._devices.values()
+                    for series in (device.base, device.tail)
+                    for buckets in series.values()
+                ),
+            }
+
+
+rollups = RollupStore(
+    max_devices=settings.ROLLUP_MAX_DEVICES,
+    refresh_interval=settings.ROLLUP_REFRESH_INTERVAL,
+    settle_seconds=settings.ROLLUP_SETTLE_SECONDS,
+)
@@ -1,20 +1,101 @@
+import hashlib
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
 from supabase.client import Client
-from app.core.database import supabase
+from app.core.config import settings
+from app.core.database import get_supabase
+from app.core.metrics import upstream_span
+from app.utils.cache import TTLCache
 
 security = HTTPBearer()
 
+# Recently validated tokens, keyed by SHA-256 of the token
+_token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+class AuthenticatedUser(BaseModel):
+    """User built from verified JWT claims; exposes the attributes routers use."""
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    app_metadata: Dict[str, Any] = {}
+    user_metadata: Dict[str, Any] = {}
+
+
+def _local_verification_enabled() -> bool:
+    return bool(settings.SUPABASE_JWT_SECRET or settings.SUPABASE_JWKS_URL)
+
+
+@lru_cache(maxsize=1)
+def _jwks_client() -> jwt.PyJWKClient:
+    return jwt.PyJWKClient(settings.SUPABASE_JWKS_URL, cache_keys=True)
+
+
+def _decode_locally(token: str) -> Dict[str, Any]:
+    if settings.SUPABASE_JWT_SECRET:
+        key, algorithms = settings.SUPABASE_JWT_SECRET, ["HS256"]
+    else:
+        key, algorithms = _jwks_client().get_signing_key_from_jwt(token).key, ["RS256", "ES256"]
+    return jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=settings.SUPABASE_JWT_AUDIENCE or None,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def _unverified_expiry(token: str) -> Optional[float]:
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+
+
+def _cache_user(key: str, user, exp: Optional[float]):
+    # Never keep a token cached past its own expiry
+    if exp is None:
+        return
+    ttl = min(settings.AUTH_TOKEN_CACHE_TTL, exp - time.time())
+    if ttl > 0:
+        _token_cache.set(key, user, ttl=ttl)
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
+    cache_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = _token_cache.get(cache_key, None)
+    if cached is not None:
+        return cached
+
     try:
-        user = supabase.auth.get_user(token)
+        if _local_verification_enabled():
+            claims = _decode_locally(token)
+            user = AuthenticatedUser(
+                id=claims["sub"],
+                email=claims.get("email"),
+                role=claims.get("role"),
+                app_metadata=claims.get("app_metadata") or {},
+                user_metadata=claims.get("user_metadata") or {},
+            )
+            _cache_user(cache_key, user, claims["exp"])
+            return user
+
+        with upstream_span("supabase", "auth", "get_user"):
+            user = get_supabase().auth.get_user(token)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        _cache_user(cache_key, user.user, _unverified_expiry(token))
         return user.user
     except Exception as e:
         raise HTTPException(
@@ -22,3 +103,19 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def _admin_user_ids() -> set:
+    return {user_id.strip() for user_id in settings.ADMIN_USER_IDS.split(",") if user_id.strip()}
+
+
+def is_admin(user) -> bool:
+    # app_metadata can only be changed with the service role key, never by the user
+    app_metadata = getattr(user, "app_metadata", None) or {}
+    return user.id in _admin_user_ids() or app_metadata.get("role") == "admin"
+
+
+def get_admin_user(user = Depends(get_current_user)):
+    if not is_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, registry
+
+subscribers_gauge = registry.register(Gauge(
+    "telemetry_subscribers", "Open live telemetry subscriptions.",
+))
+dropped_counter = registry.register(Counter(
+    "telemetry_subscribers_dropped_total", "Subscriptions closed because the client fell too far behind.",
+))
+
+
+class Subscription:
+    def __init__(self, owner_id: str, device_id: Optional[str], loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.owner_id = owner_id
+        self.device_id = device_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def _offer(self, rows: List[Dict]):
+        # Runs on the subscriber's event loop
+        if self.dropped:
+            return
+        for row in rows:
+            try:
+                self.queue.put_nowait(row)
+            except asyncio.QueueFull:
+                # Too far behind: discard the backlog and tell the reader to resync
+                self.dropped = True
+                dropped_counter.labels().inc()
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(None)
+                return
+
+
+class TelemetryBroker:
+    """
+    In-process fan-out of freshly inserted telemetry to live subscribers, keyed by
+    device owner. Publishing happens on ingest threads; each subscriber gets a bounded
+    asyncio queue on its own loop and is dropped rather than buffered without limit.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, owner_id: str, device_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(owner_id, device_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(owner_id, set()).add(sub)
+        subscribers_gauge.labels().inc()
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.owner_id)
+            if subs is None or sub not in subs:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.owner_id]
+        subscribers_gauge.labels().dec()
+
+    def publish(self, rows: Iterable[Dict], owners: Dict[str, Optional[str]]):
+        if not self._subscribers:
+            return
+        by_owner: Dict[str, List[Dict]] = {}
+        for row in rows:
+            owner_id = owners.get(str(row["device_id"]))
+            if owner_id is not None:
+                by_owner.setdefault(owner_id, []).append(row)
+        with self._lock:
+            targets = [(sub, by_owner[o]) for o in by_owner for sub in self._subscribers.get(o, ())]
+        for sub, owner_rows in targets:
+            if sub.device_id is not None:
+                owner_rows = [r for r in owner_rows if str(r["device_id"]) == sub.device_id]
+                if not owner_rows:
+                    continue
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, owner_rows)
+            except RuntimeError:
+                pass  # loop already closed; the subscription is being torn down
+
+
+telemetry_broker = TelemetryBroker(queue_size=settings.TELEMETRY_SUBSCRIBER_QUEUE_SIZE)
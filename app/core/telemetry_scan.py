@@ -0,0 +1,39 @@
+from typing import Dict, Iterable, Iterator, Optional
+
+from supabase import Client
+
+
+def scan_telemetry(
+    client: Client,
+    columns: str,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    device_ids: Optional[Iterable[str]] = None,
+    page_size: int = 1000,
+) -> Iterator[Dict]:
+    """
+    Yield telemetry rows page by page using keyset pagination on telemetry_id,
+    so large tables are never loaded (or capped by PostgREST max-rows) in one response.
+    `since` is inclusive and `until` exclusive, both on created_at.
+    """
+    if "telemetry_id" not in columns:
+        columns = f"telemetry_id, {columns}"
+    device_ids = list(device_ids) if device_ids is not None else None
+
+    last_id = None
+    while True:
+        query = client.table("telemetry").select(columns)
+        if since is not None:
+            query = query.gte("created_at", since)
+        if until is not None:
+            query = query.lt("created_at", until)
+        if device_ids is not None:
+            query = query.in_("device_id", device_ids)
+        if last_id is not None:
+            query = query.gt("telemetry_id", last_id)
+        rows = query.order("telemetry_id").limit(page_size).execute().data or []
+
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["telemetry_id"]
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from app.core.config import settings
+from app.core.database import get_supabase_admin
+from app.utils.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def _username(email: Optional[str]) -> str:
+    return email.split("@")[0] if email else "unknown"
+
+
+class UserDirectory:
+    """
+    In-process owner_id -> username map for the public leaderboard.
+    A background thread pages through auth.admin.list_users every
+    `refresh_interval` seconds, merging each page as it arrives; IDs that are
+    still unknown are looked up once and negatively cached.
+    """
+
+    def __init__(self, refresh_interval: float, page_size: int, miss_ttl: float):
+        self.refresh_interval = refresh_interval
+        self.page_size = page_size
+        self._usernames: Dict[str, str] = {}
+        self._misses = TTLCache(10000, miss_ttl)
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.lookups = 0
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._refresh_locked()
+
+    def _ensure_loaded(self):
+        with self._refresh_lock:
+            # The background thread may have finished a pass while we waited
+            if self._refreshed_at is None:
+                self._refresh_locked()
+
+    def _refresh_locked(self):
+        seen = set()
+        page = 1
+        while True:
+            users = get_supabase_admin().auth.admin.list_users(page=page, per_page=self.page_size)
+            for u in users:
+                self._usernames[u.id] = _username(u.email)
+                seen.add(u.id)
+            if len(users) < self.page_size:
+                break
+            page += 1
+        # Drop deleted users once a full pass has completed
+        for owner_id in set(self._usernames) - seen:
+            self._usernames.pop(owner_id, None)
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+
+    def _lookup(self, owner_id: str) -> str:
+        cached = self._misses.get(owner_id)
+        if cached is not MISSING:
+            return cached
+        self.lookups += 1
+        try:
+            user = get_supabase_admin().auth.admin.get_user_by_id(owner_id).user
+            username = _username(user.email if user else None)
+        except Exception as e:
+            logger.info("User lookup for %s failed: %s", owner_id, e)
+            username = "unknown"
+        if username == "unknown":
+            self._misses.set(owner_id, username)
+        else:
+            self._usernames[owner_id] = username
+        return username
+
+    def usernames(self, owner_ids: Iterable[str]) -> Dict[str, str]:
+        # Started on first use rather than at boot, so workers that never serve
+        # the leaderboard don't page through auth users
+        if self._thread is None:
+            self.start()
+        if self._refreshed_at is None:
+            try:
+                self._ensure_loaded()
+            except Exception as e:
+                logger.warning("Error fetching users: %s", e)
+        result = {}
+        for owner_id in owner_ids:
+            username = self._usernames.get(owner_id)
+            result[owner_id] = username if username is not None else self._lookup(owner_id)
+        return result
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="user-directory", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("User directory refresh failed: %s", e)
+            self._stop.wait(self.refresh_interval)
+
+    def stats(self) -> Dict:
+        return {
+            "users": len(self._usernames),
+            "refreshes": self.refreshes,
+            "lookups": self.lookups,
+            "age_seconds": None if self._refreshed_at is None else round(time.monotonic() - self._refreshed_at, 1),
+        }
+
+
+user_directory = UserDirectory(
+    refresh_interval=settings.USER_DIRECTORY_REFRESH_INTERVAL,
+    page_size=settings.USER_DIRECTORY_PAGE_SIZE,
+    miss_ttl=settings.USER_DIRECTORY_MISS_TTL,
+)
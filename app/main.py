@@ -1,24 +1,85 @@
+import time
+
+_import_started = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import devices, telemetry, inference, users
+from fastapi.responses import PlainTextResponse
+from app.routers import devices, telemetry, inference, users, blobs
 from app.core.config import settings
+from app.core.database import close_clients
+from app.core.http_pool import aclose_clients
+from app.core.metrics import CONTENT_TYPE, Gauge, MetricsMiddleware, registry
+from app.core.user_directory import user_directory
+
+logger = logging.getLogger(__name__)
+
+_import_seconds = time.perf_counter() - _import_started
+
+startup_gauge = registry.register(Gauge(
+    "app_startup_seconds", "Worker startup time by phase.", ("phase",),
+))
+
+
+def _record_startup(app: FastAPI, phase: str, seconds: float):
+    app.state.startup_timing[phase] = round(seconds, 4)
+    startup_gauge.labels(phase).set(seconds)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Supabase and HTTP clients are created on first use, so nothing here waits on the network
+    if settings.INGEST_WRITE_BEHIND:
+        telemetry.ingest_buffer.start()
+    _record_startup(app, "lifespan", time.perf_counter() - started)
+    logger.info("Startup timing (seconds): %s", app.state.startup_timing)
+    yield
+    user_directory.stop()
+    # Drain queued telemetry before the worker exits
+    await run_in_threadpool(telemetry.ingest_buffer.stop)
+    await aclose_clients()
+    close_clients()
+
+
+def create_app() -> FastAPI:
+    started = time.perf_counter()
+    app = FastAPI(title="RPI Backend", version="1.0.0", lifespan=lifespan)
+    app.state.startup_timing = {}
+    _record_startup(app, "import", _import_seconds)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allows all origins
+        allow_credentials=True,
+        allow_methods=["*"],  # Allows all methods (GET, POST, PUT, DELETE, OPTIONS, etc.)
+        allow_headers=["*"],  # Allows all headers
+    )
+
+    # Added last so it is outermost and times the whole stack
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+
+    app.include_router(devices.router)
+    app.include_router(telemetry.router)
+    app.include_router(inference.router)
+    app.include_router(users.router)
+    app.include_router(blobs.router)
+
+    @app.get("/")
+    def root():
+        return {"message": "Welcome to the RPI Backend API"}
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+    _record_startup(app, "create_app", time.perf_counter() - started)
+    return app
+
 
-app = FastAPI(title="RPI Backend", version="1.0.0")
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allows all origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods (GET, POST, PUT, DELETE, OPTIONS, etc.)
-    allow_headers=["*"],  # Allows all headers
-)
-
-app.include_router(devices.router)
-app.include_router(telemetry.router)
-app.include_router(inference.router)
-app.include_router(users.router)
-
-@app.get("/")
-def root():
-    return {"message": "Welcome to the RPI Backend API"}
+app = create_app()
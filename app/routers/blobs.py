@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from supabase import Client
+from app.core.blobs import BLOB_REF_PREFIX, blob_refs, blob_store, is_digest, sniff_content_type, sweep_unreferenced
+from app.core.config import settings
+from app.core.database import get_supabase, get_supabase_admin
+from app.core.device_registry import device_registry
+from app.core.security import get_admin_user, get_current_user
+from app.core.telemetry_scan import scan_telemetry
+from app.routers.telemetry import ingest_buffer
+from app.utils.cache import TTLCache
+
+router = APIRouter(
+    prefix="/blobs",
+    tags=["blobs"],
+)
+
+# (user_id, digest) pairs already checked, so repeat views skip the telemetry lookup
+_readable = TTLCache(maxsize=10000, ttl=300)
+
+
+def _can_read(db: Client, user_id: str, digest: str) -> bool:
+    """
+    True if one of the user's devices has a telemetry row referencing the blob.
+    Relies on the payload->>'image_data' index from migrations/001_telemetry_image_ref_index.sql.
+    """
+    if _readable.get((user_id, digest), False):
+        return True
+    device_ids = device_registry.get_owner_devices(user_id)
+    if not device_ids:
+        return False
+    found = (
+        db.table("telemetry").select("telemetry_id")
+        .in_("device_id", device_ids)
+        .eq("payload->>image_data", BLOB_REF_PREFIX + digest)
+        .limit(1)
+        .execute()
+        .data
+    )
+    if found:
+        _readable.set((user_id, digest), True)
+    return bool(found)
+
+
+@router.post("/gc")
+def collect_blobs(user = Depends(get_admin_user)):
+    """
+    Mark and sweep: delete blobs that no stored, queued or dead-lettered row references
+    and that are older than BLOB_GC_GRACE. Meant to run off-peak; it scans all telemetry.
+    """
+    # Queued rows first: a row flushed while the table is being scanned is then still counted
+    referenced = blob_refs(ingest_buffer.pending_rows())
+    referenced |= blob_refs(ingest_buffer.dead_letter_rows())
+    rows = scan_telemetry(get_supabase_admin(), "image_data:payload->>image_data")
+    referenced |= {row["image_data"] for row in rows if (row.get("image_data") or "").startswith(BLOB_REF_PREFIX)}
+    return sweep_unreferenced(referenced, settings.BLOB_GC_GRACE)
+
+
+@router.get("/{digest}")
+def get_blob(digest: str, user = Depends(get_current_user), db: Client = Depends(get_supabase)):
+    # Telemetry payloads reference images as "blob:sha256:<digest>"
+    digest = digest.removeprefix("sha256:")
+    # Same 404 for blobs that don't exist and ones the caller may not see
+    if not is_digest(digest) or not _can_read(db, user.id, digest):
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    data = blob_store.get(digest)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    return Response(
+        content=data,
+        media_type=sniff_content_type(data),
+        headers={
+            "ETag": f'"{digest}"',
+            # Content-addressed, so it can never change; private because it is per-user data
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from app.core.security import get_current_user
-from app.core.database import supabase
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Literal, Optional
+from supabase import Client
+from app.core.config import settings
+from app.core.security import get_admin_user, get_current_user
+from app.core.database import get_supabase
+from app.core.device_registry import device_registry
+from app.core.rollups import RESOLUTIONS, rollups
 from app.schemas.device import DeviceCreate, DeviceResponse
+from app.schemas.telemetry import SeriesResponse
 from datetime import datetime
+import time
 router = APIRouter(
     prefix="/devices",
     tags=["devices"],
@@ -11,9 +17,9 @@ router = APIRouter(
 )
 
 @router.post("/create", response_model=DeviceResponse)
-def create_device(device: DeviceCreate, user = Depends(get_current_user)):
+def create_device(device: DeviceCreate, user = Depends(get_current_user), db: Client = Depends(get_supabase)):
     # Check if device already exists
-    existing = supabase.table("devices").select("*").eq("device_id", device.device_id).execute()
+    existing = db.table("devices").select("*").eq("device_id", device.device_id).execute()
     if existing.data:
         raise HTTPException(status_code=400, detail="Device ID already registered")
 
@@ -23,24 +29,57 @@ def create_device(device: DeviceCreate, user = Depends(get_current_user)):
         "owner_id": user.id
     }
     
-    response = supabase.table("devices").insert(new_device).execute()
+    response = db.table("devices").insert(new_device).execute()
     
     if not response.data:
         raise HTTPException(status_code=500, detail="Failed to create device")
-    
+
+    device_registry.register(device.device_id, user.id)
     return response.data[0]
 
 @router.get("/list", response_model=List[DeviceResponse])
-def list_devices(user = Depends(get_current_user)):
-    response = supabase.table("devices").select("*").eq("owner_id", user.id).execute()
+def list_devices(user = Depends(get_current_user), db: Client = Depends(get_supabase)):
+    response = db.table("devices").select("*").eq("owner_id", user.id).execute()
     return response.data
 
 @router.delete("/delete/{device_id}")
-def delete_device(device_id: str, user = Depends(get_current_user)):
+def delete_device(device_id: str, user = Depends(get_current_user), db: Client = Depends(get_supabase)):
     # Verify ownership
-    device = supabase.table("devices").select("*").eq("device_id", device_id).eq("owner_id", user.id).execute()
-    if not device.data:
+    if device_registry.get_owner(device_id) != user.id:
         raise HTTPException(status_code=404, detail="Device not found or not owned by user")
         
-    supabase.table("devices").delete().eq("device_id", device_id).execute()
-    return {"message": "Device deleted successfully"}
\ No newline at end of file
+    db.table("devices").delete().eq("device_id", device_id).execute()
+    device_registry.invalidate(device_id, user.id)
+    rollups.forget(device_id)
+    return {"message": "Device deleted successfully"}
+
+@router.get("/series/{device_id}", response_model=SeriesResponse)
+def get_device_series(
+    device_id: str,
+    resolution: Literal["minute", "hour", "day"] = "minute",
+    start: Optional[int] = Query(None, description="Epoch seconds, defaults to 240 buckets before end"),
+    end: Optional[int] = Query(None, description="Epoch seconds (exclusive), defaults to now"),
+    user = Depends(get_current_user),
+):
+    if device_registry.get_owner(device_id) != user.id:
+        raise HTTPException(status_code=404, detail="Device not found or not owned by user")
+
+    size = RESOLUTIONS[resolution]
+    end = end if end is not None else int(time.time()) + 1
+    start = start if start is not None else end - 240 * size
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) // size > settings.ROLLUP_MAX_POINTS:
+        raise HTTPException(status_code=400, detail="Time range too large for this resolution")
+
+    return {
+        "device_id": device_id,
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "points": rollups.query(device_id, resolution, start, end),
+    }
+
+@router.get("/cache/stats")
+def device_cache_stats(user = Depends(get_admin_user)):
+    return device_registry.stats()
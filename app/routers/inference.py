@@ -1,12 +1,21 @@
-import base64
+import asyncio
 import json
-import urllib.request
-from urllib.error import HTTPError, URLError
+import time
+from typing import AsyncIterator
 
+import httpx
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
+from app.core.admission import AdmissionRejected, Ticket, inference_admission
 from app.core.config import settings
-from app.core.security import get_current_user
+from app.core.http_pool import gemini_client
+from app.core.images import ImageFetchError, image_pipeline
+from app.core.inference_cache import inference_cache
+from app.core.metrics import upstream_span
+from app.core.model_router import FALLTHROUGH_STATUSES, model_router
+from app.core.security import get_admin_user, get_current_user
 from app.schemas.inference import LLMRequest, VLMRequest
 
 router = APIRouter(
@@ -14,16 +23,25 @@ router = APIRouter(
     tags=["inference"],
 )
 
+# Tried in this order after the requested model
+FALLBACK_MODELS = ("gemini-2.5-pro", "gemini-pro-latest", "gemini-2.5-flash", "gemini-2.0-flash")
+# Upper bound on concurrent upstream calls for one hedged request
+MAX_HEDGED_REQUESTS = 2
+# Cancellation message for calls that lost a hedge race, to tell them apart
+# from calls cancelled because the client went away
+HEDGE_LOST = "hedge lost"
 
-def _gemini_generate(model: str, parts: list[dict]) -> str:
+
+def _model_label(model: str) -> str:
+    # request.model is client input; anything but our own models shares one metric series
+    return model if model in FALLBACK_MODELS else "other"
+
+
+async def _gemini_generate(model: str, parts: list[dict]) -> str:
     if not settings.GEMINI_API_KEY:
         raise HTTPException(status_code=500, detail="GEMINI_API_KEY is not configured")
 
     normalized_model = (model or "gemini-2.5-pro").replace("models/", "")
-    url = (
-        f"https://generativelanguage.googleapis.com/v1beta/models/{normalized_model}:generateContent"
-        f"?key={settings.GEMINI_API_KEY}"
-    )
     payload = {
         "contents": [
             {
@@ -32,20 +50,19 @@ def _gemini_generate(model: str, parts: list[dict]) -> str:
             }
         ]
     }
-    req = urllib.request.Request(
-        url,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
     try:
-        with urllib.request.urlopen(req, timeout=45) as resp:
-            body = json.loads(resp.read().decode("utf-8"))
-    except HTTPError as e:
-        detail = e.read().decode("utf-8", errors="ignore") or str(e)
-        raise HTTPException(status_code=e.code, detail=f"Gemini HTTP error: {detail}")
-    except URLError as e:
-        raise HTTPException(status_code=500, detail=f"Gemini connection error: {e}")
+        with upstream_span("gemini", "generate", _model_label(normalized_model)):
+            resp = await gemini_client().post(
+                f"/v1beta/models/{normalized_model}:generateContent",
+                json=payload,
+            )
+            resp.raise_for_status()
+            body = resp.json()
+    except httpx.HTTPStatusError as e:
+        detail = e.response.text or str(e)
+        raise HTTPException(status_code=e.response.status_code, detail=f"Gemini HTTP error: {detail}")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Gemini connection error: {e!r}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini request failed: {e}")
 
@@ -61,16 +78,11 @@ def _gemini_generate(model: str, parts: list[dict]) -> str:
     return response_text
 
 
-def _gemini_generate_with_fallback(requested_model: str, parts: list[dict]) -> str:
+def _models_to_try(requested_model: str) -> list[str]:
     candidates = []
     if requested_model:
         candidates.append(requested_model)
-    candidates.extend([
-        "gemini-2.5-pro",
-        "gemini-pro-latest",
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-    ])
+    candidates.extend(FALLBACK_MODELS)
     # Preserve order while removing duplicates
     seen = set()
     models_to_try = []
@@ -80,47 +92,277 @@ def _gemini_generate_with_fallback(requested_model: str, parts: list[dict]) -> s
             continue
         seen.add(key)
         models_to_try.append(key)
+    return models_to_try
+
+
+async def _gemini_generate_tracked(model: str, parts: list[dict]) -> str:
+    start = time.monotonic()
+    try:
+        response_text = await _gemini_generate(model, parts)
+    except HTTPException as e:
+        model_router.record_failure(model, e.status_code)
+        raise
+    except asyncio.CancelledError as e:
+        if e.args and e.args[0] == HEDGE_LOST:
+            model_router.record_hedge_loss(model, time.monotonic() - start)
+        else:
+            # Cancelled from outside; says nothing about the model
+            model_router.release(model)
+        raise
+    model_router.record_success(model, time.monotonic() - start)
+    return response_text
+
+
+async def _gemini_generate_with_fallback(requested_model: str, parts: list[dict]) -> str:
+    """
+    Try models in preference order, skipping ones with an open circuit. With
+    INFERENCE_HEDGE_AFTER set, a request still running after that many seconds
+    is raced against the next model and the first answer wins.
+    """
+    models_to_try = model_router.order(_models_to_try(requested_model))
+    hedge_after = settings.INFERENCE_HEDGE_AFTER
+
+    pending: set[asyncio.Task] = set()
+
+    def launch():
+        # Models whose half-open circuit is already being probed by another request are skipped
+        while models_to_try:
+            model = models_to_try.pop(0)
+            if model_router.begin(model):
+                pending.add(asyncio.create_task(_gemini_generate_tracked(model, parts)))
+                return
 
     last_error: HTTPException | None = None
-    for model in models_to_try:
+    won = False
+    launch()
+    try:
+        while pending:
+            can_hedge = hedge_after > 0 and models_to_try and len(pending) < MAX_HEDGED_REQUESTS
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=hedge_after if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                launch()
+                continue
+            # Successes first; exception() is called on every finished task so none go unretrieved
+            for task in sorted(done, key=lambda t: t.exception() is not None):
+                e = task.exception()
+                if e is None:
+                    won = True
+                    return task.result()
+                last_error = e
+                # Move on for missing or overloaded models; surface other failures immediately.
+                if not isinstance(e, HTTPException) or e.status_code not in FALLTHROUGH_STATUSES:
+                    raise e
+            if not pending and models_to_try:
+                launch()
+    finally:
+        for task in pending:
+            task.cancel(HEDGE_LOST if won else None)
+
+    raise last_error or HTTPException(status_code=500, detail="Gemini generation failed")
+
+
+async def _gemini_stream(model: str, parts: list[dict]) -> AsyncIterator[str]:
+    """Yield text chunks from Gemini's SSE streaming endpoint as they arrive."""
+    if not settings.GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY is not configured")
+
+    normalized_model = (model or "gemini-2.5-pro").replace("models/", "")
+    payload = {"contents": [{"role": "user", "parts": parts}]}
+    try:
+        with upstream_span("gemini", "stream", _model_label(normalized_model)):
+            async with gemini_client().stream(
+                "POST",
+                f"/v1beta/models/{normalized_model}:streamGenerateContent",
+                params={"alt": "sse"},
+                json=payload,
+            ) as resp:
+                if resp.status_code >= 400:
+                    detail = (await resp.aread()).decode("utf-8", errors="ignore") or resp.reason_phrase
+                    raise HTTPException(status_code=resp.status_code, detail=f"Gemini HTTP error: {detail}")
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[len("data:"):])
+                    for candidate in chunk.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                yield part["text"]
+    except HTTPException:
+        raise
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Gemini connection error: {e!r}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gemini request failed: {e}")
+
+
+async def _prepend(first: str, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+async def _gemini_stream_with_fallback(requested_model: str, parts: list[dict]) -> AsyncIterator[str]:
+    """
+    Open a stream on the first model that answers, with the same fallback order as
+    _gemini_generate_with_fallback. Waits for the first chunk so errors can still
+    be returned as a normal HTTP error before the SSE response starts.
+    """
+    last_error: HTTPException | None = None
+    for model in model_router.order(_models_to_try(requested_model)):
+        if not model_router.begin(model):
+            continue
+        start = time.monotonic()
+        chunks = _gemini_stream(model, parts)
         try:
-            return _gemini_generate(model, parts)
+            first = await anext(chunks)
+        except StopAsyncIteration:
+            model_router.release(model)
+            raise HTTPException(status_code=500, detail="Gemini returned empty text")
+        except asyncio.CancelledError:
+            model_router.release(model)
+            raise
         except HTTPException as e:
+            model_router.record_failure(model, e.status_code)
             last_error = e
-            # Retry on model-not-found; surface other failures immediately.
-            if e.status_code != 404:
+            # Move on for missing or overloaded models; surface other failures immediately.
+            if e.status_code not in FALLTHROUGH_STATUSES:
                 raise e
+            continue
+        # Latency to first chunk is what streaming callers wait for
+        model_router.record_success(model, time.monotonic() - start)
+        return _prepend(first, chunks)
 
     raise last_error or HTTPException(status_code=500, detail="Gemini generation failed")
 
 
-def _fetch_image_as_inline_data(image_url: str) -> dict:
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def _sse_stream(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
     try:
-        with urllib.request.urlopen(image_url, timeout=30) as img_resp:
-            img_bytes = img_resp.read()
-            mime_type = img_resp.headers.get_content_type() or "image/jpeg"
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to fetch image_url: {e}")
-
-    if not mime_type.startswith("image/"):
-        mime_type = "image/jpeg"
-    if not img_bytes:
-        raise HTTPException(status_code=400, detail="Image URL returned empty content")
-
-    return {
-        "inline_data": {
-            "mime_type": mime_type,
-            "data": base64.b64encode(img_bytes).decode("utf-8"),
-        }
-    }
+        async for text in chunks:
+            yield _sse({"text": text})
+    except HTTPException as e:
+        yield _sse({"status_code": e.status_code, "detail": e.detail}, event="error")
+        return
+    yield _sse({}, event="done")
+
+
+def _sse_response(chunks: AsyncIterator[str], background: BackgroundTask | None = None) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_stream(chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background,
+    )
+
+
+async def _fetch_image_as_inline_data(image_url: str) -> dict:
+    try:
+        image = await image_pipeline.fetch(image_url)
+    except ImageFetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return image.as_part()
+
+
+async def _admit(user_id: str) -> Ticket:
+    try:
+        return await inference_admission.acquire(user_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.detail, headers={"Retry-After": str(int(e.retry_after))})
+
+
+async def _generate_cached(requested_model: str, parts: list[dict], user_id: str) -> str:
+    key = inference_cache.key(requested_model, parts)
+
+    async def compute() -> str:
+        # Only cache misses take an upstream slot
+        ticket = await _admit(user_id)
+        try:
+            return await _gemini_generate_with_fallback(requested_model, parts)
+        finally:
+            ticket.release()
+
+    return await inference_cache.get_or_compute(key, compute)
+
+
+async def _cache_stream(key: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    # Store the full completion once the stream finishes cleanly
+    collected = []
+    async for text in chunks:
+        collected.append(text)
+        yield text
+    response_text = "".join(collected).strip()
+    if response_text:
+        await inference_cache.set(key, response_text)
+
+
+async def _release_ticket(ticket: Ticket):
+    # Async so Starlette runs it on the event loop, which owns the controller
+    ticket.release()
+
+
+async def _release_after(ticket: Ticket, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        async for text in chunks:
+            yield text
+    finally:
+        ticket.release()
+
+
+async def _stream_cached(requested_model: str, parts: list[dict], user_id: str) -> StreamingResponse:
+    key = inference_cache.key(requested_model, parts)
+    cached = await inference_cache.get(key)
+    if cached is not None:
+        return _sse_response(_replay(cached))
+    # The slot is held until the stream ends; the background task covers a
+    # response that is never iterated
+    ticket = await _admit(user_id)
+    try:
+        chunks = await _gemini_stream_with_fallback(requested_model, parts)
+    except BaseException:
+        ticket.release()
+        raise
+    return _sse_response(_release_after(ticket, _cache_stream(key, chunks)), BackgroundTask(_release_ticket, ticket))
+
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+@router.get("/cache/stats")
+def inference_cache_stats(user = Depends(get_admin_user)):
+    return inference_cache.stats()
+
+
+@router.get("/images/stats")
+def image_stats(user = Depends(get_admin_user)):
+    return image_pipeline.stats()
+
+
+@router.get("/models/stats")
+async def model_stats(user = Depends(get_admin_user)):
+    return model_router.stats()
+
+
+@router.get("/admission/stats")
+async def admission_stats(user = Depends(get_admin_user)):
+    return inference_admission.stats()
 
 
 @router.post("/llm")
-def run_llm(request: LLMRequest, user = Depends(get_current_user)):
+async def run_llm(request: LLMRequest, user = Depends(get_current_user)):
     try:
-        response_text = _gemini_generate_with_fallback(
+        response_text = await _generate_cached(
             request.model or "gemini-2.5-pro",
             [{"text": request.prompt}],
+            user.id,
         )
         return {"response": response_text}
     except Exception as e:
@@ -129,15 +371,33 @@ def run_llm(request: LLMRequest, user = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/vlm")
-def run_vlm(request: VLMRequest, user = Depends(get_current_user)):
+async def run_vlm(request: VLMRequest, user = Depends(get_current_user)):
     try:
-        image_part = _fetch_image_as_inline_data(request.image_url)
-        response_text = _gemini_generate_with_fallback(
+        image_part = await _fetch_image_as_inline_data(request.image_url)
+        response_text = await _generate_cached(
             request.model or "gemini-2.5-pro",
             [{"text": request.prompt}, image_part],
+            user.id,
         )
         return {"response": response_text}
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/llm/stream")
+async def stream_llm(request: LLMRequest, user = Depends(get_current_user)):
+    return await _stream_cached(
+        request.model or "gemini-2.5-pro",
+        [{"text": request.prompt}],
+        user.id,
+    )
+
+@router.post("/vlm/stream")
+async def stream_vlm(request: VLMRequest, user = Depends(get_current_user)):
+    image_part = await _fetch_image_as_inline_data(request.image_url)
+    return await _stream_cached(
+        request.model or "gemini-2.5-pro",
+        [{"text": request.prompt}, image_part],
+        user.id,
+    )
@@ -1,32 +1,312 @@
-from fastapi import APIRouter, HTTPException, Body
-from app.core.database import supabase
-from app.schemas.telemetry import TelemetryPayload
+from fastapi import APIRouter, Depends, HTTPException, Body, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from typing import List
+from app.core.blobs import BlobTooLarge, offload_image
+from app.core.config import settings
+from app.core.database import get_supabase
+from app.core.device_registry import device_registry
+from app.core.ingest_buffer import IngestBuffer, IngestBufferFull
+from app.core.ingest_codec import IngestRoute, decode_frames, frame_payloads
+from app.core.leaderboard import leaderboard
+from app.core.metrics import Counter, Gauge, registry
+from app.core.rollups import rollups
+from app.core.security import get_admin_user
+from app.core.telemetry_broker import telemetry_broker
+from app.schemas.telemetry import (
+    TelemetryPayload,
+    TelemetryBatchItem,
+    TelemetryBatchResult,
+    TelemetryBatchResponse,
+)
+from app.utils.ids import telemetry_ids
+import asyncio
+import json
+import logging
 import time
-import random
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     tags=["telemetry"],
+    # Accepts gzip/zstd bodies and MessagePack or fixed binary frames besides JSON
+    route_class=IngestRoute,
 )
 
-@router.post("/ingest/{device_id}")
-def ingest_data(device_id: str, payload: TelemetryPayload):
-    # Verify device exists
-    device = supabase.table("devices").select("device_id").eq("device_id", device_id).execute()
-    if not device.data:
-        raise HTTPException(status_code=404, detail="Device not found")
-    
-    # Insert telemetry
+
+def _build_row(device_id, payload: TelemetryPayload, created_at: int) -> dict:
     # We store the Pydantic model as a dict in the JSONB column
-    data = {
-        "telemetry_id": random.randint(0, 100000000),
+    data = payload.model_dump(mode='json')
+    # Inline images go to the blob store; the row keeps only a reference
+    try:
+        data["image_data"] = offload_image(data.get("image_data"))
+    except BlobTooLarge:
+        raise HTTPException(status_code=413, detail=f"image_data exceeds {settings.BLOB_MAX_BYTES} bytes")
+    return {
+        # Time-ordered and unique across workers, no database round trip
+        "telemetry_id": telemetry_ids.next_id(),
         "device_id": device_id,
-        "payload": payload.model_dump(mode='json'),
-        "created_at": int(time.time())
+        "payload": data,
+        "created_at": created_at,
     }
-    
-    response = supabase.table("telemetry").insert(data).execute()
-    
+
+
+def _insert_rows(rows: List[dict]) -> List[dict]:
+    # Only the insert: a failure here means nothing was stored, so the
+    # write-behind buffer and clients can safely retry it
+    response = get_supabase().table("telemetry").insert(rows).execute()
     if not response.data:
         raise HTTPException(status_code=500, detail="Failed to ingest data")
-        
-    return response.data[0]
+    return response.data
+
+
+def _after_insert(rows: List[dict]):
+    """Feed stored rows to the in-memory aggregates and live subscribers. Never raises."""
+    try:
+        # Owners were resolved when the readings were accepted, so these are usually cache hits
+        owners = device_registry.get_owners(row["device_id"] for row in rows)
+    except Exception:
+        logger.exception("Could not resolve owners for %d stored telemetry rows", len(rows))
+        owners = {}
+    hooks = (
+        ("leaderboard", lambda: leaderboard.add_rows(rows, owners)),
+        ("rollups", lambda: rollups.add_rows(rows)),
+        ("broker", lambda: telemetry_broker.publish(rows, owners)),
+    )
+    for name, hook in hooks:
+        try:
+            hook()
+        except Exception:
+            # The rows are committed; a stale aggregate catches up at its next rebuild
+            logger.exception("Post-insert %s update for %d telemetry rows failed", name, len(rows))
+
+
+def _insert_now(rows: List[dict]) -> List[dict]:
+    """Insert rows for a caller that is told about failures and will retry."""
+    # Images offloaded for rows that then fail are left for the blob sweep
+    # (POST /blobs/gc); other rows may reference the same content-addressed blob
+    stored = _insert_rows(rows)
+    _after_insert(rows)
+    return stored
+
+
+# Write-behind queue, started by the app lifespan when INGEST_WRITE_BEHIND is on
+ingest_buffer = IngestBuffer(
+    _insert_rows,
+    on_flushed=_after_insert,
+    max_rows=settings.INGEST_BUFFER_MAX_ROWS,
+    flush_rows=settings.INGEST_FLUSH_ROWS,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL,
+    dead_letter_path=settings.INGEST_DEAD_LETTER_FILE,
+)
+
+
+def _write(rows: List[dict], response: Response) -> List[dict]:
+    """Insert rows now, or queue them and mark the response 202 in write-behind mode."""
+    if not settings.INGEST_WRITE_BEHIND:
+        return _insert_now(rows)
+
+    try:
+        ingest_buffer.submit(rows)
+    except IngestBufferFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingest queue is full, retry later",
+            headers={"Retry-After": str(max(1, int(settings.INGEST_FLUSH_INTERVAL)))},
+        )
+    response.status_code = 202
+    return rows
+
+
+def _ingest_batch(items: List[tuple[str, TelemetryPayload]], response: Response) -> TelemetryBatchResponse:
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > settings.INGEST_MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds {settings.INGEST_MAX_BATCH_SIZE} readings",
+        )
+
+    # One registry lookup (at most one round-trip) for every distinct device in the batch
+    owners = device_registry.get_owners(device_id for device_id, _ in items)
+
+    created_at = int(time.time())
+    results: List[TelemetryBatchResult] = []
+    rows = []
+    for index, (device_id, payload) in enumerate(items):
+        if owners.get(device_id) is None:
+            results.append(TelemetryBatchResult(
+                index=index, device_id=device_id, status="error", detail="Device not found"
+            ))
+            continue
+        try:
+            row = _build_row(device_id, payload, created_at)
+        except HTTPException as e:
+            results.append(TelemetryBatchResult(
+                index=index, device_id=device_id, status="error", detail=e.detail
+            ))
+            continue
+        rows.append(row)
+        results.append(TelemetryBatchResult(
+            index=index, device_id=device_id, status="ok", telemetry_id=row["telemetry_id"]
+        ))
+
+    if rows:
+        # Single round-trip for the whole batch
+        _write(rows, response)
+
+    return TelemetryBatchResponse(
+        accepted=len(rows),
+        rejected=len(results) - len(rows),
+        results=results,
+    )
+
+
+# Registered before /ingest/{device_id} so "batch" is not captured as a device id
+@router.post("/ingest/batch", response_model=TelemetryBatchResponse)
+def ingest_multi_device_batch(items: List[TelemetryBatchItem], response: Response):
+    return _ingest_batch([(item.device_id, item.payload) for item in items], response)
+
+
+@router.get("/ingest/buffer/stats")
+def ingest_buffer_stats(user = Depends(get_admin_user)):
+    return {"enabled": settings.INGEST_WRITE_BEHIND, **ingest_buffer.stats()}
+
+
+@router.post("/ingest/{device_id}/batch", response_model=TelemetryBatchResponse)
+def ingest_device_batch(device_id: str, payloads: List[TelemetryPayload], response: Response):
+    return _ingest_batch([(device_id, payload) for payload in payloads], response)
+
+
+@router.post("/ingest/{device_id}")
+def ingest_data(device_id: str, payload: TelemetryPayload, response: Response):
+    # Verify device exists
+    if device_registry.get_owner(device_id) is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    # Insert telemetry (or queue it in write-behind mode)
+    data = _build_row(device_id, payload, int(time.time()))
+    return _write([data], response)[0]
+
+
+ws_sessions = registry.register(Gauge(
+    "ingest_websocket_sessions", "Open WebSocket ingest sessions.",
+))
+ws_readings = registry.register(Counter(
+    "ingest_websocket_readings_total", "Readings received over WebSocket ingest, by result.", ("result",),
+))
+
+
+def _parse_ws_message(message: dict, device_id: str) -> List[TelemetryPayload]:
+    if message.get("bytes") is not None:
+        items = frame_payloads(decode_frames(message["bytes"]), device_id)
+    else:
+        data = json.loads(message["text"])
+        items = data if isinstance(data, list) else [data]
+    if len(items) > settings.INGEST_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Message exceeds {settings.INGEST_MAX_BATCH_SIZE} readings")
+    return [TelemetryPayload.model_validate(item) for item in items]
+
+
+def _store_readings(device_id: str, readings: List[tuple[TelemetryPayload, int]]) -> tuple[int, List[str]]:
+    """Build and write a session's pending readings; returns (stored, per-reading errors)."""
+    rows, errors = [], []
+    for payload, created_at in readings:
+        try:
+            rows.append(_build_row(device_id, payload, created_at))
+        except HTTPException as e:
+            errors.append(e.detail)
+    if rows:
+        if settings.INGEST_WRITE_BEHIND:
+            ingest_buffer.submit(rows)
+        else:
+            _insert_now(rows)
+    return len(rows), errors
+
+
+@router.websocket("/ingest/ws/{device_id}")
+async def ingest_stream(websocket: WebSocket, device_id: str):
+    """
+    Persistent ingest channel for one device. Send readings as JSON text messages
+    (a TelemetryPayload or a list of them) or as binary x-telemetry-frame frames.
+    Readings are written in batches, each followed by
+    {"type": "ack", "received": n, "stored": n, "rejected": n}; problems are reported as
+    {"type": "error", "detail": ...} without closing the session.
+    """
+    await websocket.accept()
+    # The device is checked once per session instead of once per reading
+    if await run_in_threadpool(device_registry.get_owner, device_id) is None:
+        await websocket.close(code=4404, reason="Device not found")
+        return
+
+    pending: List[tuple[TelemetryPayload, int]] = []
+    counts = {"received": 0, "stored": 0, "rejected": 0}
+    flush_lock = asyncio.Lock()
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict):
+        async with send_lock:
+            try:
+                await websocket.send_json(message)
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # the client went away; the receive loop will notice
+
+    async def flush():
+        async with flush_lock:
+            if not pending:
+                return
+            readings = pending[:]
+            pending.clear()
+            try:
+                stored, errors = await run_in_threadpool(_store_readings, device_id, readings)
+            except Exception as e:
+                counts["rejected"] += len(readings)
+                ws_readings.labels("rejected").inc(len(readings))
+                detail = "Ingest queue is full, retry later" if isinstance(e, IngestBufferFull) else getattr(e, "detail", str(e))
+                await send({"type": "error", "detail": detail, "dropped": len(readings)})
+                return
+            counts["stored"] += stored
+            counts["rejected"] += len(errors)
+            ws_readings.labels("stored").inc(stored)
+            ws_readings.labels("rejected").inc(len(errors))
+            ack = {"type": "ack", **counts}
+            if errors:
+                ack["errors"] = errors[:10]
+            await send(ack)
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(settings.INGEST_WS_FLUSH_INTERVAL)
+            await flush()
+
+    sessions = ws_sessions.labels()
+    sessions.inc()
+    flusher = asyncio.create_task(flush_periodically())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                payloads = _parse_ws_message(message, device_id)
+            except ValidationError as e:
+                await send({"type": "error", "detail": e.errors(include_url=False, include_context=False)})
+                continue
+            except HTTPException as e:
+                await send({"type": "error", "detail": e.detail})
+                continue
+            except ValueError as e:
+                await send({"type": "error", "detail": f"Invalid message: {e}"})
+                continue
+
+            created_at = int(time.time())
+            pending.extend((payload, created_at) for payload in payloads)
+            counts["received"] += len(payloads)
+            # Writing inline stops us reading, which pushes back on a fast sender
+            if len(pending) >= settings.INGEST_WS_FLUSH_ROWS:
+                await flush()
+    finally:
+        flusher.cancel()
+        sessions.dec()
+        # Whatever arrived before the disconnect is still written
+        await flush()
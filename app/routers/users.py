@@ -1,101 +1,196 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Dict, Any
-from app.core.security import get_current_user
-from app.core.database import supabase
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Literal, Optional, Tuple
+import asyncio
+import base64
+import json
+from supabase import Client
 from app.core.config import settings
-from app.utils.scoring import calculate_score
+from app.core.security import get_admin_user, get_current_user
+from app.core.database import get_supabase
+from app.core.device_registry import device_registry
+from app.core.leaderboard import ALL_TIME, leaderboard
+from app.core.telemetry_broker import telemetry_broker
+from app.core.user_directory import user_directory
+from app.utils.scoring import record_scores
 from app.schemas.telemetry import TelemetryResponse
-from supabase import create_client, Client
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
 )
 
-# Initialize admin client for fetching users
-# Note: This requires SUPABASE_SERVICE_ROLE_KEY to be set in .env
-supabase_admin: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+LeaderboardWindow = Literal["all", "hour", "day", "week"]
+
+CURSOR_FIELDS = ("created_at", "telemetry_id")
+
+def _encode_cursor(record: Dict[str, Any]) -> str:
+    raw = json.dumps({name: record[name] for name in CURSOR_FIELDS})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The values end up in a PostgREST filter string, so accept nothing but the two integers
+    if not isinstance(data, dict) or set(data) != set(CURSOR_FIELDS):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    values = tuple(data[name] for name in CURSOR_FIELDS)
+    if any(type(value) is not int for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def _fetch_page(db: Client, device_ids: List[str], limit: int, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of telemetry, newest first, keyset-paginated on (created_at, telemetry_id)."""
+    query = db.table("telemetry").select("*").in_("device_id", device_ids)
+    if cursor:
+        created_at, telemetry_id = _decode_cursor(cursor)
+        query = query.or_(
+            f"created_at.lt.{created_at:d},"
+            f"and(created_at.eq.{created_at:d},telemetry_id.lt.{telemetry_id:d})"
+        )
+    # Fetch one extra row to learn whether another page exists
+    data = (
+        query.order("created_at", desc=True)
+        .order("telemetry_id", desc=True)
+        .limit(limit + 1)
+        .execute()
+        .data
+    )
+    next_cursor = _encode_cursor(data[limit - 1]) if len(data) > limit else None
+    data = data[:limit]
+
+    # Score every record in one vectorized pass
+    for record, score in zip(data, record_scores(data)):
+        # Add score to the record so it matches TelemetryResponse schema
+        record["score"] = score
+    return data, next_cursor
 
 @router.get("/data", response_model=List[TelemetryResponse])
-def get_all_user_data(user = Depends(get_current_user)):
+def get_all_user_data(
+    response: Response,
+    limit: int = Query(settings.USER_DATA_PAGE_SIZE, ge=1, le=settings.USER_DATA_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    user = Depends(get_current_user),
+    db: Client = Depends(get_supabase),
+):
     # 1. Get all device IDs owned by the user
-    devices_response = supabase.table("devices").select("device_id").eq("owner_id", user.id).execute()
+    device_ids = device_registry.get_owner_devices(user.id)
     
-    if not devices_response.data:
+    if not device_ids:
         return []
-        
-    device_ids = [d["device_id"] for d in devices_response.data]
     
-    # 2. Fetch telemetry for all these devices
-    response = supabase.table("telemetry").select("*").in_("device_id", device_ids).order("created_at", desc=True).execute()
-    
-    data = response.data
-    
-    # 3. Calculate score for each record
-    result = []
-    for record in data:
-        # Use the utility function to calculate score for this single record
-        # calculate_score expects a list of records
-        score = calculate_score([record])
-        
-        # Add score to the record so it matches TelemetryResponse schema
-        record["score"] = score
-        result.append(record)
+    # 2. Fetch one page of telemetry for all these devices
+    data, next_cursor = _fetch_page(db, device_ids, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
         
-    return result
+    return data
+
+@router.get("/data/stream")
+def stream_user_data(
+    page_size: int = Query(settings.USER_DATA_PAGE_SIZE, ge=1, le=settings.USER_DATA_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user = Depends(get_current_user),
+    db: Client = Depends(get_supabase),
+):
+    """Full telemetry history as NDJSON, fetched and emitted one page at a time."""
+    device_ids = device_registry.get_owner_devices(user.id)
+    if cursor:
+        _decode_cursor(cursor)
+
+    def generate(cursor: Optional[str]):
+        while device_ids:
+            data, cursor = _fetch_page(db, device_ids, page_size, cursor)
+            for record in data:
+                yield TelemetryResponse.model_validate(record).model_dump_json() + "\n"
+            if not cursor:
+                return
+
+    return StreamingResponse(generate(cursor), media_type="application/x-ndjson")
+
+@router.get("/data/subscribe")
+async def subscribe_user_data(
+    device_id: Optional[str] = Query(None, description="Only readings from this device"),
+    user = Depends(get_current_user),
+):
+    """
+    Server-sent events with each new reading for the user's devices as it is ingested
+    (event "telemetry", same shape as /users/data records). A client that falls too far
+    behind gets a "dropped" event and should reconnect, backfilling via /users/data.
+    """
+    if device_id is not None and device_id not in await run_in_threadpool(device_registry.get_owner_devices, user.id):
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    async def events():
+        # Subscribed inside the generator so the finally below always unsubscribes
+        sub = telemetry_broker.subscribe(user.id, device_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(sub.queue.get(), settings.TELEMETRY_SUBSCRIBE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # Send everything already queued in one go
+                rows = []
+                while item is not None:
+                    rows.append(item)
+                    item = None if sub.queue.empty() else sub.queue.get_nowait()
+                for record, score in zip(rows, record_scores(rows)):
+                    body = TelemetryResponse.model_validate({**record, "score": score}).model_dump_json()
+                    yield f"id: {record['telemetry_id']}\nevent: telemetry\ndata: {body}\n\n"
+                if sub.dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'detail': 'Subscriber fell behind; reconnect and backfill'})}\n\n"
+                    return
+        finally:
+            telemetry_broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/leaderboard")
-def get_leaderboard(limit: int = Query(20, ge=1, le=100)):
-    # 1. Fetch all devices using admin client (bypass RLS)
-    devices_resp = supabase_admin.table("devices").select("device_id, owner_id").execute()
-    if not devices_resp.data:
+def get_leaderboard(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    window: LeaderboardWindow = "all",
+):
+    # 1. Scores come from running per-user aggregates, not a telemetry scan
+    if window == ALL_TIME:
+        # Windows refresh themselves; only the all-time totals need the full scan
+        leaderboard.ensure_fresh()
+    page = leaderboard.page(window, offset, limit)
+    if not page:
         return []
-        
-    # Map device_id to owner_id
-    device_owner_map = {d["device_id"]: d["owner_id"] for d in devices_resp.data}
-    
-    # 2. Fetch all telemetry using admin client (bypass RLS)
-    telemetry_resp = supabase_admin.table("telemetry").select("*").execute()
-    
-    # 3. Group telemetry by user
-    user_telemetry: Dict[str, List[Any]] = {}
-    
-    for record in telemetry_resp.data:
-        d_id = record.get("device_id")
-        owner_id = device_owner_map.get(d_id)
-        
-        if owner_id:
-            if owner_id not in user_telemetry:
-                user_telemetry[owner_id] = []
-            user_telemetry[owner_id].append(record)
     
-    # 4. Fetch user details (email) using admin client
-    # Note: supabase-py doesn't expose list_users directly on auth.admin easily in older versions,
-    # but we can try to fetch users or just use the IDs if listing is restricted.
-    # However, supabase-py v2+ supports admin.list_users()
-    
-    user_map = {}
-    try:
-        users_resp = supabase_admin.auth.admin.list_users()
-        for u in users_resp:
-            user_map[u.id] = u.email
-    except Exception as e:
-        print(f"Error fetching users: {e}")
-            
-    # 5. Calculate scores
-    leaderboard = []
-    for owner_id, records in user_telemetry.items():
-        score = calculate_score(records)
-        
-        email = user_map.get(owner_id, "unknown@example.com")
-        username = email.split("@")[0] if email else "unknown"
-        
-        leaderboard.append({
-            "username": username,
+    # 2. Attach usernames (already sorted by score descending)
+    usernames = user_directory.usernames(owner_id for _, owner_id, _ in page)
+    return [
+        {
+            "rank": rank,
+            "username": usernames[owner_id],
             "score": score
-        })
-        
-    # Sort by score descending
-    leaderboard.sort(key=lambda x: x["score"], reverse=True)
-    
-    return leaderboard[:limit]
+        }
+        for rank, owner_id, score in page
+    ]
+
+@router.get("/leaderboard/me")
+def get_my_rank(window: LeaderboardWindow = "all", user = Depends(get_current_user)):
+    if window == ALL_TIME:
+        leaderboard.ensure_fresh()
+    position = leaderboard.rank_of(user.id, window)
+    if position is None:
+        return {"rank": None, "score": None, "total": len(leaderboard.ranking(window).entries)}
+    rank, score, total = position
+    return {"rank": rank, "score": score, "total": total}
+
+@router.post("/leaderboard/rebuild")
+def rebuild_leaderboard(user = Depends(get_admin_user)):
+    leaderboard.rebuild()
+    return leaderboard.stats()
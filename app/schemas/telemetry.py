@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field, field_serializer
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class TelemetryPayload(BaseModel):
@@ -10,6 +10,38 @@ class TelemetryPayload(BaseModel):
 class TelemetryCreate(BaseModel):
     payload: TelemetryPayload
 
+class TelemetryBatchItem(BaseModel):
+    # Same type as the {device_id} path parameter, so "007" stays "007"; numbers are accepted as before
+    device_id: str = Field(..., coerce_numbers_to_str=True)
+    payload: TelemetryPayload
+
+class TelemetryBatchResult(BaseModel):
+    index: int
+    device_id: str
+    status: str = Field(..., description="'ok' or 'error'")
+    telemetry_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class TelemetryBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[TelemetryBatchResult]
+
+class SeriesPoint(BaseModel):
+    t: int = Field(..., description="Bucket start, epoch seconds")
+    count: int
+    min: float
+    max: float
+    mean: float
+    mean_score: float
+
+class SeriesResponse(BaseModel):
+    device_id: str
+    resolution: str
+    start: int
+    end: int
+    points: List[SeriesPoint]
+
 class TelemetryResponse(BaseModel):
     telemetry_id: int
     device_id: int
@@ -17,5 +49,10 @@ class TelemetryResponse(BaseModel):
     created_at: Optional[datetime] = None
     score: float
 
+    # 64-bit IDs lose precision as JSON numbers in JavaScript, so they go out as strings
+    @field_serializer("telemetry_id", when_used="json")
+    def _telemetry_id_as_string(self, telemetry_id: int) -> str:
+        return str(telemetry_id)
+
     class Config:
         from_attributes = True
@@ -0,0 +1,291 @@
+"""
+In-memory stand-in for the Supabase client, for tests and benchmarks.
+
+Implements the subset of the PostgREST query builder and auth API the app uses:
+
+    fake = FakeSupabase()
+    token = fake.add_user("alice@example.com")
+    fake.tables["devices"].append({"device_id": "1", "owner_id": fake.user_id(token), "name": "a"})
+    install(fake)  # point every app module at the fake
+"""
+import copy
+import re
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+_CONDITION = re.compile(r"^([\w]+)\.(eq|neq|gt|gte|lt|lte)\.(.*)$", re.S)
+
+
+@dataclass
+class FakeUser:
+    id: str
+    email: str
+    role: str = "authenticated"
+    app_metadata: Dict[str, Any] = field(default_factory=dict)
+    user_metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class FakeUserResponse:
+    user: Optional[FakeUser]
+
+
+@dataclass
+class FakeResponse:
+    data: List[Dict[str, Any]]
+    count: Optional[int] = None
+
+
+def _coerce(value: Any, like: Any) -> Any:
+    """Compare filter values the way Postgres would: numerically against numeric columns."""
+    if isinstance(like, bool) or like is None:
+        return value
+    if isinstance(like, (int, float)):
+        # int first: bigint IDs above 2**53 would round as floats
+        for number in (int, float):
+            try:
+                return number(value)
+            except (TypeError, ValueError):
+                pass
+        return value
+    return str(value)
+
+
+def _compare(op: str, left: Any, right: Any) -> bool:
+    if left is None:
+        return False
+    right = _coerce(right, left)
+    if isinstance(left, (int, float)) and not isinstance(right, (int, float)):
+        left = str(left)
+    if op == "eq":
+        return left == right
+    if op == "neq":
+        return left != right
+    if op == "gt":
+        return left > right
+    if op == "gte":
+        return left >= right
+    if op == "lt":
+        return left < right
+    return left <= right
+
+
+def _split_top_level(expr: str) -> List[str]:
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(expr):
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(expr[start:i])
+            start = i + 1
+    parts.append(expr[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_logic(expr: str) -> Callable[[Dict], bool]:
+    """Parse a PostgREST logic tree such as `a.lt.1,and(b.eq."x",c.gt.2)` (the contents of or=(...))."""
+    terms = []
+    for part in _split_top_level(expr):
+        if part.startswith(("and(", "or(")) and part.endswith(")"):
+            combine = all if part.startswith("and(") else any
+            inner = _parse_logic(part[part.index("(") + 1:-1])
+            terms.append(lambda row, inner=inner, combine=combine: inner(row, combine))
+            continue
+        m = _CONDITION.match(part)
+        if not m:
+            raise ValueError(f"Unsupported filter: {part}")
+        column, op, value = m.groups()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        terms.append(lambda row, c=column, o=op, v=value, combine=None: _compare(o, row.get(c), v))
+    return lambda row, combine=any: combine(t(row) for t in terms)
+
+
+def _json_path(expr: str) -> Optional[tuple]:
+    # payload->key (JSON) and payload->>key (text)
+    m = re.match(r"^(\w+)->(>?)(\w+)$", expr)
+    return m.groups() if m else None
+
+
+def _column_value(row: Dict, column: str) -> Any:
+    path = _json_path(column)
+    if path is None:
+        return row.get(column)
+    name, as_text, key = path
+    value = row.get(name).get(key) if isinstance(row.get(name), dict) else None
+    return str(value) if as_text and value is not None else value
+
+
+def _project(row: Dict, columns: List[str]) -> Dict:
+    if columns == ["*"]:
+        return copy.deepcopy(row)
+    out = {}
+    for column in columns:
+        alias, _, expr = column.rpartition(":")
+        path = _json_path(expr)
+        if path is not None:
+            out[alias or path[2]] = copy.deepcopy(_column_value(row, expr))
+        else:
+            out[alias or expr] = copy.deepcopy(row.get(expr))
+    return out
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns = ["*"]
+        self._filters: List[Callable[[Dict], bool]] = []
+        self._orders: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._payload: List[Dict] = []
+
+    # Operations
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self._op = "select"
+        self._columns = [c.strip() for c in columns.split(",") if c.strip()]
+        return self
+
+    def insert(self, rows):
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # Filters
+    def _filter(self, column: str, op: str, value: Any):
+        self._filters.append(lambda row: _compare(op, _column_value(row, column), value))
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any):
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any):
+        return self._filter(column, "lte", value)
+
+    def in_(self, column: str, values):
+        # Compared as text, which is how PostgREST sends the list anyway
+        values = {str(v) for v in values}
+        self._filters.append(lambda row: _column_value(row, column) is not None and str(_column_value(row, column)) in values)
+        return self
+
+    def or_(self, filters: str):
+        self._filters.append(_parse_logic(filters))
+        return self
+
+    # Modifiers
+    def order(self, column: str, desc: bool = False):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def execute(self) -> FakeResponse:
+        with self._db.lock:
+            self._db.queries += 1
+            rows = self._db.tables.setdefault(self._table, [])
+            if self._op == "insert":
+                inserted = copy.deepcopy(self._payload)
+                rows.extend(copy.deepcopy(inserted))
+                return FakeResponse(inserted)
+
+            matched = [row for row in rows if all(f(row) for f in self._filters)]
+            if self._op == "delete":
+                doomed = {id(row) for row in matched}
+                self._db.tables[self._table] = [row for row in rows if id(row) not in doomed]
+                return FakeResponse(copy.deepcopy(matched))
+
+            for column, desc in reversed(self._orders):
+                # Postgres sorts NULLs last ascending and first descending
+                matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            end = None if self._limit is None else self._offset + self._limit
+            return FakeResponse([_project(row, self._columns) for row in matched[self._offset:end]])
+
+
+class FakeAdmin:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+
+    def list_users(self, page: int = 1, per_page: int = 50) -> List[FakeUser]:
+        users = list(self._db.users.values())
+        start = (page - 1) * per_page
+        return users[start:start + per_page]
+
+    def get_user_by_id(self, user_id: str) -> FakeUserResponse:
+        for user in self._db.users.values():
+            if user.id == user_id:
+                return FakeUserResponse(user)
+        raise ValueError(f"User not found: {user_id}")
+
+
+class FakeAuth:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+        self.admin = FakeAdmin(db)
+
+    def get_user(self, token: str) -> FakeUserResponse:
+        self._db.auth_calls += 1
+        user = self._db.users.get(token)
+        if user is None:
+            raise ValueError("Invalid token")
+        return FakeUserResponse(user)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables: Dict[str, List[Dict]] = {"devices": [], "telemetry": []}
+        # Opaque bearer token -> user
+        self.users: Dict[str, FakeUser] = {}
+        self.lock = threading.RLock()
+        self.queries = 0
+        self.auth_calls = 0
+        self.auth = FakeAuth(self)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def add_user(self, email: str, user_id: Optional[str] = None) -> str:
+        """Create a user and return a bearer token for it."""
+        token = uuid.uuid4().hex
+        self.users[token] = FakeUser(id=user_id or str(uuid.uuid4()), email=email)
+        return token
+
+    def user_id(self, token: str) -> str:
+        return self.users[token].id
+
+
+def install(fake: FakeSupabase):
+    """Use `fake` as both the regular and the admin Supabase client."""
+    from app.core.database import set_clients
+
+    set_clients(fake, fake)
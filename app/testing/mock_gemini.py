@@ -0,0 +1,75 @@
+"""
+Minimal stand-in for the Gemini generateContent API, for tests and benchmarks.
+
+    MOCK_GEMINI_LATENCY=0.2 uvicorn app.testing.mock_gemini:app --port 8081
+    GEMINI_BASE_URL=http://127.0.0.1:8081 GEMINI_API_KEY=test uvicorn app.main:app
+"""
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+# Models answering 404, to exercise the fallback path
+UNKNOWN_MODELS = set(filter(None, os.getenv("MOCK_GEMINI_UNKNOWN_MODELS", "gpt-4o").split(",")))
+# Models answering 503, to exercise circuit breaking
+OVERLOADED_MODELS = set(filter(None, os.getenv("MOCK_GEMINI_OVERLOADED_MODELS", "").split(",")))
+
+app = FastAPI(title="Mock Gemini")
+app.state.latency = float(os.getenv("MOCK_GEMINI_LATENCY", "0"))
+# Delay between streamed chunks
+app.state.chunk_delay = float(os.getenv("MOCK_GEMINI_CHUNK_DELAY", "0"))
+app.state.requests = 0
+# Extra per-model latency in seconds, e.g. {"gemini-2.5-pro": 2.0} to exercise hedging
+app.state.model_latency = {}
+
+
+def _check_model(model: str):
+    app.state.requests += 1
+    if model in UNKNOWN_MODELS:
+        raise HTTPException(status_code=404, detail=f"models/{model} is not found")
+    if model in OVERLOADED_MODELS:
+        raise HTTPException(status_code=503, detail="The model is overloaded. Please try again later.")
+
+
+def _latency(model: str) -> float:
+    return app.state.latency + app.state.model_latency.get(model, 0)
+
+
+def _reply_text(body: dict) -> str:
+    parts = body.get("contents", [{}])[0].get("parts", [])
+    prompt = " ".join(p["text"] for p in parts if "text" in p)
+    images = sum(1 for p in parts if "inline_data" in p)
+    return f"echo: {prompt}" + (f" [{images} image(s)]" if images else "")
+
+
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    _check_model(model)
+    body = await request.json()
+    if _latency(model):
+        await asyncio.sleep(_latency(model))
+    return {
+        "candidates": [
+            {"content": {"role": "model", "parts": [{"text": _reply_text(body)}]}, "finishReason": "STOP"}
+        ],
+        "modelVersion": model,
+    }
+
+
+@app.post("/v1beta/models/{model}:streamGenerateContent")
+async def stream_generate_content(model: str, request: Request):
+    _check_model(model)
+    body = await request.json()
+
+    async def events():
+        if _latency(model):
+            await asyncio.sleep(_latency(model))
+        for word in _reply_text(body).split(" "):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": word + " "}]}}]}
+            yield f"data: {json.dumps(chunk)}\r\n\r\n"
+            if app.state.chunk_delay:
+                await asyncio.sleep(app.state.chunk_delay)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
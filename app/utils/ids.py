@@ -0,0 +1,125 @@
+"""
+Snowflake-style 64-bit IDs: 41 bits of milliseconds since EPOCH_MS, 10 bits of
+worker id and a 12-bit per-millisecond sequence. IDs are unique across processes
+that hold different worker ids, increase with time (good index locality, usable for
+keyset pagination) and need no database round trip.
+
+They exceed 32 bits, so the column must be bigint (migrations/002_telemetry_id_bigint.sql);
+they also exceed 2**53, so the read APIs send them to clients as strings.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import IO, Optional
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, fall back to the process id
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+_generators: "weakref.WeakSet[SnowflakeGenerator]" = weakref.WeakSet()
+
+
+class SnowflakeGenerator:
+    def __init__(self, worker_id: Optional[int] = None, slot_dir: str = "data/workers"):
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        self._configured_worker_id = worker_id
+        self.slot_dir = Path(slot_dir)
+        self._worker_id: Optional[int] = None
+        self._slot_file: Optional[IO] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        _generators.add(self)
+
+    def _after_fork_in_child(self):
+        # The inherited descriptor shares the parent's flock; closing it here means only the
+        # parent holds that slot, and this process claims its own on first use. The lock is
+        # replaced because another parent thread may have held it at fork time.
+        if self._slot_file is not None:
+            self._slot_file.close()
+            self._slot_file = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def worker_id(self) -> int:
+        with self._lock:
+            self._ensure_worker()
+            return self._worker_id
+
+    def _ensure_worker(self):
+        # Claimed lazily and again after a fork, so pre-forked workers never share an id
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._last_ms = -1
+        self._sequence = 0
+        self._worker_id = self._configured_worker_id if self._configured_worker_id is not None else self._claim_slot()
+
+    def _claim_slot(self) -> int:
+        """Hold an exclusive lock on the first free slot file; the OS releases it when the process exits."""
+        if fcntl is None:
+            logger.warning("No flock available; deriving worker id from the pid. Set WORKER_ID to be safe.")
+            return os.getpid() & MAX_WORKER_ID
+        self.slot_dir.mkdir(parents=True, exist_ok=True)
+        start = os.getpid() & MAX_WORKER_ID
+        for i in range(MAX_WORKER_ID + 1):
+            slot = (start + i) & MAX_WORKER_ID
+            f = open(self.slot_dir / f"worker-{slot}.lock", "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            self._slot_file = f
+            return slot
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} worker id slots in {self.slot_dir} are taken")
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._ensure_worker()
+            now = int(time.time() * 1000)
+            if now < self._last_ms:
+                # Clock stepped back: keep counting on the last timestamp rather than risk duplicates
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 4096 IDs this millisecond already: borrow the next one; the clock
+                    # catches up through the branch above
+                    now = self._last_ms + 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) | (self._worker_id << SEQUENCE_BITS) | self._sequence
+
+
+def _reset_after_fork():
+    for generator in list(_generators):
+        generator._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+telemetry_ids = SnowflakeGenerator(
+    worker_id=int(settings.WORKER_ID) if settings.WORKER_ID else None,
+    slot_dir=settings.WORKER_ID_DIR,
+)
@@ -1,35 +1,95 @@
-from re import S
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Hashable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAX_POTENTIOMETER_VALUE = 8190
+
+def score_value(val: Any) -> Optional[float]:
+    """
+    Score of a single potentiometer reading, or None if the value isn't numeric.
+    A user's score is the average of these over their records.
+    """
+    if isinstance(val, bool) or not isinstance(val, (int, float)):
+        return None
+    return (MAX_POTENTIOMETER_VALUE - val) / MAX_POTENTIOMETER_VALUE
+
+def _decode_payload(payload: Any) -> Dict[str, Any]:
+    # Handle case where payload might be a string (if not automatically parsed) or dict
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return {}
+    return payload if isinstance(payload, dict) else {}
+
+def _numeric(val: Any) -> float:
+    if isinstance(val, bool) or not isinstance(val, (int, float)):
+        return np.nan
+    return val
+
+def to_value_array(values: Sequence[Any]) -> np.ndarray:
+    """Raw potentiometer values as a float array; non-numeric or missing values become NaN."""
+    return np.fromiter((_numeric(v) for v in values), dtype=np.float64, count=len(values))
+
+def _legacy_value(val: Any) -> Any:
+    # calculate_score always read a missing reading as 0 and counted booleans as 0/1
+    return float(val) if isinstance(val, bool) else val
+
+def extract_values(telemetry_data: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    Potentiometer values of a result set as a float array, decoding JSON-string
+    payloads once. Missing values are 0, other non-numeric values become NaN.
+    """
+    return to_value_array([
+        _legacy_value(_decode_payload(record.get("payload", {})).get("potentiometer_value", 0.0))
+        for record in telemetry_data
+    ])
+
+def score_values(values: Iterable[float]) -> np.ndarray:
+    """Per-record scores for a columnar array of potentiometer values (NaN stays NaN)."""
+    values = np.asarray(values, dtype=np.float64)
+    return (MAX_POTENTIOMETER_VALUE - values) / MAX_POTENTIOMETER_VALUE
+
+def score_records(telemetry_data: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Per-record scores for a whole result set in one vectorized pass."""
+    return score_values(extract_values(telemetry_data))
+
+def record_scores(telemetry_data: Sequence[Dict[str, Any]]) -> List[float]:
+    """Display score of each record: rounded to 2 places, 0.0 where the value isn't numeric."""
+    scores = score_records(telemetry_data)
+    return np.where(np.isnan(scores), 0.0, np.round(scores, 2)).tolist()
+
+def group_score_totals(scores: np.ndarray, keys: Sequence[Hashable]) -> Dict[Hashable, Tuple[float, int]]:
+    """Sum and count of the non-NaN scores for each distinct key."""
+    if len(keys) == 0:
+        return {}
+    scores = np.asarray(scores, dtype=np.float64)
+    positions: Dict[Hashable, int] = {}
+    inverse = np.fromiter((positions.setdefault(k, len(positions)) for k in keys), dtype=np.intp, count=len(keys))
+    valid = ~np.isnan(scores)
+    sums = np.bincount(inverse[valid], weights=scores[valid], minlength=len(positions))
+    counts = np.bincount(inverse[valid], minlength=len(positions))
+    return {key: (float(sums[i]), int(counts[i])) for key, i in positions.items()}
+
+def group_average_scores(scores: np.ndarray, keys: Sequence[Hashable]) -> Dict[Hashable, float]:
+    """Rounded average score per key, 0.0 for keys without numeric records."""
+    return {
+        key: round(total / count, 2) if count else 0.0
+        for key, (total, count) in group_score_totals(scores, keys).items()
+    }
 
 def calculate_score(telemetry_data: List[Dict[str, Any]]) -> float:
     """
     Calculates a user's score based on their telemetry data.
-    It averages the 'potentiometer_value' from the payload.
+    It averages the per-record score of 'potentiometer_value' from the payload.
     """
     if not telemetry_data:
         return 0.0
-        
-    total_score = 0.0
-    count = 0
-    
-    for record in telemetry_data:
-        payload = record.get("payload", {})
-        # Handle case where payload might be a string (if not automatically parsed) or dict
-        if isinstance(payload, str):
-            import json
-            try:
-                payload = json.loads(payload)
-            except:
-                payload = {}
-                
-        val = payload.get("potentiometer_value", 0.0)
-        print(f"val: {val}")
-        score = (8190 - val) / 8190
-        if isinstance(val, (int, float)):
-            total_score += score
-            count += 1
-            
-    if count == 0:
+
+    scores = score_records(telemetry_data)
+    valid = scores[~np.isnan(scores)]
+    if valid.size == 0:
         return 0.0
-        
-    return round(total_score / count, 2)
+
+    return round(float(valid.mean()), 2)
@@ -0,0 +1,378 @@
+"""
+End-to-end API benchmarks against the in-memory Supabase fake and the mock Gemini server.
+
+    python -m benchmarks.bench_api [--suites ingest users inference] [--sizes 1000 10000 100000]
+                                   [--concurrency 1 8 32] [--json] [--output results.json]
+
+Suites:
+  ingest     rows/s through POST /ingest/{device_id} and /ingest/{device_id}/batch,
+             with direct writes and with the write-behind buffer
+  users      GET /users/data and /users/leaderboard latency as the telemetry table grows
+  inference  POST /inference/llm throughput and latency at increasing concurrency,
+             with the mock Gemini answering after --gemini-latency seconds
+  spike      POST /ingest latency on its own and during a burst of inference calls
+
+Database-bound numbers include the fake's linear scans, so compare runs with each
+other rather than reading them as production latencies.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+MOCK_GEMINI_PORT = _free_port()
+
+# Settings are read at import time, so the environment has to be in place before the app is loaded
+os.environ["SUPABASE_JWT_SECRET"] = ""
+os.environ["SUPABASE_JWKS_URL"] = ""
+os.environ["GEMINI_API_KEY"] = "bench"
+os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{MOCK_GEMINI_PORT}"
+os.environ["INFERENCE_CACHE_DIR"] = ""
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.device_registry import device_registry  # noqa: E402
+from app.core.http_pool import aclose_clients  # noqa: E402
+from app.core.leaderboard import leaderboard  # noqa: E402
+from app.core.rollups import rollups  # noqa: E402
+from app.core.user_directory import user_directory  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routers.telemetry import ingest_buffer  # noqa: E402
+from app.testing import mock_gemini  # noqa: E402
+from app.testing.fake_supabase import FakeSupabase, install  # noqa: E402
+
+WEEK = 7 * 86400
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _check(response: httpx.Response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text}")
+    return response
+
+
+class World:
+    """A fresh fake database with one benchmark user and a crowd of other device owners."""
+
+    def __init__(self, owners: int, devices_per_user: int):
+        self.fake = FakeSupabase()
+        install(self.fake)
+        self.token = self.fake.add_user("bench@example.com")
+        self.user_id = self.fake.user_id(self.token)
+        self.headers = {"Authorization": f"Bearer {self.token}"}
+        self.devices = [str(1000 + i) for i in range(devices_per_user)]
+        self.fake.tables["devices"] = [
+            {"device_id": device_id, "owner_id": self.user_id, "name": f"bench-{device_id}"}
+            for device_id in self.devices
+        ]
+        for i in range(owners):
+            token = self.fake.add_user(f"owner{i}@example.com")
+            self.fake.tables["devices"].append(
+                {"device_id": str(i + 1), "owner_id": self.fake.user_id(token), "name": f"device-{i + 1}"}
+            )
+        self.all_devices = [d["device_id"] for d in self.fake.tables["devices"]]
+        self._reset_caches()
+
+    def seed_telemetry(self, rows: int, seed: int = 0):
+        rng = random.Random(seed)
+        now = int(time.time())
+        self.fake.tables["telemetry"] = [
+            {
+                "telemetry_id": i + 1,
+                # A quarter of the readings belong to the benchmark user so /users/data has pages to walk
+                "device_id": rng.choice(self.devices if rng.random() < 0.25 else self.all_devices),
+                "payload": {"potentiometer_value": rng.uniform(0, 8190)},
+                "created_at": now - rng.randrange(WEEK),
+            }
+            for i in range(rows)
+        ]
+
+    def _reset_caches(self):
+        # The app's caches are process-wide, so forget whatever a previous world left behind
+        for device_id in self.all_devices:
+            device_registry.invalidate(device_id)
+            rollups.forget(device_id)
+        user_directory.refresh()
+
+
+def bench_ingest(args) -> List[Dict]:
+    world = World(owners=10, devices_per_user=4)
+    results = []
+    with TestClient(app) as client:
+        for write_behind in (False, True):
+            settings.INGEST_WRITE_BEHIND = write_behind
+            if write_behind:
+                ingest_buffer.start()
+            for batch_size in args.batch_sizes:
+                world.fake.tables["telemetry"] = []
+                requests = max(1, args.ingest_rows // batch_size)
+                payloads = [{"potentiometer_value": float(i % 8190)} for i in range(batch_size)]
+                samples = []
+                start = time.perf_counter()
+                for i in range(requests):
+                    device_id = world.devices[i % len(world.devices)]
+                    t0 = time.perf_counter()
+                    if batch_size == 1:
+                        _check(client.post(f"/ingest/{device_id}", json=payloads[0]))
+                    else:
+                        _check(client.post(f"/ingest/{device_id}/batch", json=payloads))
+                    samples.append(time.perf_counter() - t0)
+                if write_behind:
+                    # Count rows as ingested once they have reached the database
+                    while len(world.fake.tables["telemetry"]) < requests * batch_size:
+                        time.sleep(0.001)
+                elapsed = time.perf_counter() - start
+                results.append({
+                    "mode": "write_behind" if write_behind else "direct",
+                    "batch_size": batch_size,
+                    "rows": requests * batch_size,
+                    "rows_per_s": round(requests * batch_size / elapsed, 1),
+                    **_summary(samples),
+                })
+            if write_behind:
+                ingest_buffer.stop()
+    settings.INGEST_WRITE_BEHIND = False
+    return results
+
+
+def bench_users(args) -> List[Dict]:
+    world = World(owners=args.owners, devices_per_user=4)
+    results = []
+    with TestClient(app) as client:
+        for size in args.sizes:
+            world.seed_telemetry(size)
+            queries = world.fake.queries
+            rebuild = _timed(leaderboard.rebuild, 1)[0]
+            # The first call also pays for the device registry lookup
+            data_cold = _timed(lambda: _check(client.get("/users/data", headers=world.headers)), 1)[0]
+
+            data = _timed(lambda: _check(client.get("/users/data", headers=world.headers)), args.repeat)
+            cursor = client.get("/users/data", headers=world.headers).headers.get("X-Next-Cursor")
+            next_page = _timed(
+                lambda: _check(client.get("/users/data", params={"cursor": cursor}, headers=world.headers)),
+                args.repeat,
+            ) if cursor else None
+            board = _timed(lambda: _check(client.get("/users/leaderboard")), args.repeat)
+            board_week = _timed(lambda: _check(client.get("/users/leaderboard", params={"window": "week"})), args.repeat)
+            me = _timed(lambda: _check(client.get("/users/leaderboard/me", headers=world.headers)), args.repeat)
+
+            results.append({
+                "rows": size,
+                "owners": args.owners + 1,
+                "data_cold_ms": round(data_cold * 1000, 3),
+                "data": _summary(data),
+                "data_next_page": _summary(next_page) if next_page else None,
+                "leaderboard": _summary(board),
+                "leaderboard_week": _summary(board_week),
+                "leaderboard_me": _summary(me),
+                "leaderboard_rebuild_ms": round(rebuild * 1000, 3),
+                "db_queries": world.fake.queries - queries,
+            })
+    return results
+
+
+# One mock Gemini server on MOCK_GEMINI_PORT, shared by every suite that needs it
+_mock_gemini: Optional[Tuple[uvicorn.Server, threading.Thread]] = None
+MOCK_GEMINI_STARTUP_TIMEOUT = 10.0
+
+
+def _start_mock_gemini(latency: float):
+    global _mock_gemini
+    mock_gemini.app.state.latency = latency
+    if _mock_gemini is not None:
+        return
+    server = uvicorn.Server(uvicorn.Config(mock_gemini.app, host="127.0.0.1", port=MOCK_GEMINI_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="mock-gemini", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + MOCK_GEMINI_STARTUP_TIMEOUT
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Mock Gemini server failed to start on port {MOCK_GEMINI_PORT}")
+        if time.monotonic() > deadline:
+            server.should_exit = True
+            raise RuntimeError(f"Mock Gemini server did not start within {MOCK_GEMINI_STARTUP_TIMEOUT}s")
+        time.sleep(0.01)
+    _mock_gemini = server, thread
+
+
+def _stop_mock_gemini():
+    global _mock_gemini
+    if _mock_gemini is None:
+        return
+    server, thread = _mock_gemini
+    server.should_exit = True
+    thread.join(timeout=MOCK_GEMINI_STARTUP_TIMEOUT)
+    _mock_gemini = None
+
+
+async def _inference_level(client: httpx.AsyncClient, headers: Dict, concurrency: int, requests: int, cached: bool) -> Dict:
+    samples, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in remaining:
+            prompt = "bench" if cached else f"bench {uuid.uuid4().hex}"
+            t0 = time.perf_counter()
+            response = await client.post("/inference/llm", json={"prompt": prompt, "model": "gemini-2.5-flash"}, headers=headers)
+            samples.append(time.perf_counter() - t0)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "cached": cached,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "requests_per_s": round(requests / elapsed, 1),
+        **_summary(samples),
+    }
+
+
+def bench_inference(args) -> List[Dict]:
+    world = World(owners=0, devices_per_user=1)
+    _start_mock_gemini(args.gemini_latency)
+
+    async def run():
+        results = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for cached in (False, True):
+                for concurrency in args.concurrency:
+                    requests = max(concurrency * 4, args.inference_requests)
+                    results.append(await _inference_level(client, world.headers, concurrency, requests, cached))
+        await aclose_clients()
+        return results
+
+    results = asyncio.run(run())
+    for r in results:
+        r["gemini_latency_ms"] = round(args.gemini_latency * 1000, 3)
+    return results
+
+
+def bench_spike(args) -> List[Dict]:
+    world = World(owners=0, devices_per_user=1)
+    _start_mock_gemini(args.gemini_latency)
+    spike_requests = max(args.concurrency) * 8
+
+    async def ingest_latencies(client: httpx.AsyncClient, n: int) -> List[float]:
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            _check(await client.post(f"/ingest/{world.devices[0]}", json={"potentiometer_value": 1.0}))
+            samples.append(time.perf_counter() - t0)
+        return samples
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            baseline = await ingest_latencies(client, args.repeat * 5)
+            burst = asyncio.gather(*(
+                client.post("/inference/llm", json={"prompt": f"spike {uuid.uuid4().hex}", "model": "gemini-2.5-flash"}, headers=world.headers)
+                for _ in range(spike_requests)
+            ))
+            await asyncio.sleep(0)
+            during = await ingest_latencies(client, args.repeat * 5)
+            statuses = [r.status_code for r in await burst]
+        await aclose_clients()
+        return baseline, during, statuses
+
+    baseline, during, statuses = asyncio.run(run())
+    return [
+        {"phase": "baseline", **_summary(baseline)},
+        {
+            "phase": "inference_spike",
+            "spike_requests": spike_requests,
+            "spike_ok": statuses.count(200),
+            "spike_rejected": statuses.count(429),
+            **_summary(during),
+        },
+    ]
+
+
+SUITES = {"ingest": bench_ingest, "users": bench_users, "inference": bench_inference, "spike": bench_spike}
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "platform": platform.platform(), "commit": commit or None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES), default=list(SUITES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Telemetry rows for the users suite")
+    parser.add_argument("--owners", type=int, default=200, help="Other device owners on the leaderboard")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--ingest-rows", type=int, default=20000, help="Rows to ingest per batch size")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--inference-requests", type=int, default=200)
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="Mock Gemini response time in seconds")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    report = {"benchmark": "api", "environment": _environment(), "results": {}}
+    try:
+        for name in args.suites:
+            report["results"][name] = SUITES[name](args)
+    finally:
+        _stop_mock_gemini()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, rows in report["results"].items():
+        print(f"== {name}")
+        for row in rows:
+            print("  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compare the vectorized scoring API with the original per-record loop.
+
+    python -m benchmarks.bench_scoring [--sizes 1000 10000 100000] [--json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from app.utils.scoring import (
+    calculate_score,
+    extract_values,
+    group_average_scores,
+    record_scores,
+    score_records,
+    score_values,
+)
+
+
+def legacy_calculate_score(telemetry_data: List[Dict[str, Any]]) -> float:
+    # Verbatim copy of calculate_score before the vectorized rewrite
+    if not telemetry_data:
+        return 0.0
+    total_score = 0.0
+    count = 0
+    for record in telemetry_data:
+        payload = record.get("payload", {})
+        if isinstance(payload, str):
+            import json
+            try:
+                payload = json.loads(payload)
+            except:
+                payload = {}
+        val = payload.get("potentiometer_value", 0.0)
+        print(f"val: {val}")
+        score = (8190 - val) / 8190
+        if isinstance(val, (int, float)):
+            total_score += score
+            count += 1
+    if count == 0:
+        return 0.0
+    return round(total_score / count, 2)
+
+
+def make_records(n: int, owners: int) -> List[Dict[str, Any]]:
+    rng = random.Random(n)
+    records = []
+    for i in range(n):
+        payload = {"potentiometer_value": rng.uniform(0, 8190)}
+        records.append({
+            "telemetry_id": i,
+            "device_id": i % owners,
+            # Some rows come back from the database as JSON strings
+            "payload": json.dumps(payload) if i % 10 == 0 else payload,
+        })
+    return records
+
+
+def _timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes: List[int], owners: int, repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for n in sizes:
+        records = make_records(n, owners)
+        keys = [r["device_id"] for r in records]
+
+        legacy_per_record = _timed(lambda: [legacy_calculate_score([r]) for r in records], repeat)
+        batch_per_record = _timed(lambda: record_scores(records), repeat)
+        values = extract_values(records)
+        columnar = _timed(lambda: score_values(values), repeat)
+
+        def legacy_groups():
+            groups: Dict[int, List] = {}
+            for r in records:
+                groups.setdefault(r["device_id"], []).append(r)
+            return {k: legacy_calculate_score(v) for k, v in groups.items()}
+
+        legacy_grouped = _timed(legacy_groups, repeat)
+        batch_grouped = _timed(lambda: group_average_scores(score_records(records), keys), repeat)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert abs(legacy_calculate_score(records) - calculate_score(records)) <= 0.01
+
+        results.append({
+            "records": n,
+            "per_record_legacy_s": round(legacy_per_record, 6),
+            "per_record_batch_s": round(batch_per_record, 6),
+            "per_record_speedup": round(legacy_per_record / batch_per_record, 1),
+            "columnar_s": round(columnar, 6),
+            "grouped_legacy_s": round(legacy_grouped, 6),
+            "grouped_batch_s": round(batch_grouped, 6),
+            "grouped_speedup": round(legacy_grouped / batch_grouped, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--owners", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.owners, args.repeat)
+    if args.json:
+        print(json.dumps({"benchmark": "scoring", "results": results}, indent=2))
+        return
+    for r in results:
+        print(
+            f"{r['records']:>8} records  per-record {r['per_record_legacy_s']:.4f}s -> {r['per_record_batch_s']:.4f}s "
+            f"({r['per_record_speedup']}x)  columnar {r['columnar_s']:.5f}s  grouped {r['grouped_legacy_s']:.4f}s -> {r['grouped_batch_s']:.4f}s "
+            f"({r['grouped_speedup']}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+-- Blob reads (GET /blobs/{digest}) look up telemetry rows by their image reference:
+--   select telemetry_id from telemetry
+--   where device_id in (...) and payload->>'image_data' = 'blob:sha256:<digest>' limit 1
+-- Without an index on the expression that is a scan of the user's telemetry per new image.
+-- A hash index because image_data can also hold long inline strings that don't fit a btree entry.
+create index concurrently if not exists telemetry_image_data_idx
+    on telemetry using hash ((payload->>'image_data'));
@@ -0,0 +1,4 @@
+-- Telemetry IDs are generated by the API (app/utils/ids.py): 64-bit values around 2^57,
+-- which overflow an integer column. Run before deploying the ID generator.
+-- Rewrites the table and holds an ACCESS EXCLUSIVE lock while it does.
+alter table telemetry alter column telemetry_id type bigint;
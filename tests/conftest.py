@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+# Settings are read at import time, so the environment has to be in place before the app is loaded
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+# Never used: install() swaps the fake in for the real clients
+os.environ["SUPABASE_URL"] = "http://supabase.test"
+os.environ["SUPABASE_KEY"] = "test"
+os.environ["SUPABASE_SERVICE_ROLE_KEY"] = "test"
+os.environ["SUPABASE_JWT_SECRET"] = ""
+os.environ["SUPABASE_JWKS_URL"] = ""
+os.environ["INFERENCE_CACHE_DIR"] = ""
+os.environ["INGEST_WRITE_BEHIND"] = "false"
+os.environ["BLOB_STORE_DIR"] = os.path.join(_scratch, "blobs")
+os.environ["WORKER_ID_DIR"] = os.path.join(_scratch, "workers")
+os.environ["INGEST_DEAD_LETTER_FILE"] = os.path.join(_scratch, "dead_letter.jsonl")
+
+import pytest  # noqa: E402
+
+from app.core.device_registry import device_registry  # noqa: E402
+from app.testing.fake_supabase import FakeSupabase, install  # noqa: E402
+
+
+@pytest.fixture
+def fake() -> FakeSupabase:
+    """A fresh in-memory database behind both Supabase clients."""
+    db = FakeSupabase()
+    install(db)
+    # The registry is process-wide; don't let owners from another test leak in
+    device_registry._owners.clear()
+    device_registry._owner_devices.clear()
+    return db
+
+
+@pytest.fixture
+def client(fake):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
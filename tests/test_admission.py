@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, AdmissionRejected
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = {"max_concurrent": 1, "max_queue": 10, "max_queue_per_user": 10, "queue_timeout": 5.0}
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_admits_up_to_limit_without_queueing():
+    async def run():
+        controller = _controller(max_concurrent=2)
+        first = await controller.acquire("a")
+        second = await controller.acquire("a")
+        assert controller.stats()["active"] == 2
+        first.release()
+        first.release()  # idempotent
+        second.release()
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_waiting_users_are_served_round_robin():
+    async def run():
+        controller = _controller()
+        holder = await controller.acquire("busy")
+        order = []
+
+        async def request(user_id: str, n: int):
+            async with controller.admit(user_id):
+                order.append(f"{user_id}{n}")
+                await asyncio.sleep(0)
+
+        # One user floods the queue before another arrives
+        tasks = [asyncio.create_task(request("busy", n)) for n in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("quiet", 0)))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 4
+
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["busy0", "quiet0", "busy1", "busy2"]
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects():
+    async def run():
+        controller = _controller(max_queue=2)
+        holder = await controller.acquire("a")
+        waiting = [asyncio.create_task(controller.acquire(user)) for user in ("b", "c")]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("d")
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.retry_after >= 1
+        holder.release()
+        for task in waiting:
+            (await task).release()
+        assert controller.stats()["rejected"]["queue_full"] == 1
+
+    asyncio.run(run())
+
+
+def test_per_user_queue_limit():
+    async def run():
+        controller = _controller(max_queue_per_user=1)
+        holder = await controller.acquire("a")
+        waiting = asyncio.create_task(controller.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("a")
+        assert rejected.value.reason == "user_queue_full"
+        other = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        holder.release()
+        (await waiting).release()
+        (await other).release()
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_frees_the_place():
+    async def run():
+        controller = _controller(queue_timeout=0.05)
+        holder = await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.reason == "timeout"
+        stats = controller.stats()
+        assert (stats["queued"], stats["queued_users"]) == (0, 0)
+        holder.release()
+        assert controller.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_leak_the_slot():
+    async def run():
+        controller = _controller()
+        holder = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        holder.release()
+        assert controller.stats()["active"] == 0
+        (await controller.acquire("c")).release()
+
+    asyncio.run(run())
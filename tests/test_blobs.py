@@ -0,0 +1,105 @@
+import base64
+import json
+import os
+import time
+
+import pytest
+
+from app.core.blobs import BLOB_REF_PREFIX, blob_store
+from app.core.config import settings
+from app.routers.telemetry import ingest_buffer
+
+# Enough of a PNG for the content sniffing that decides what gets offloaded
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _image(tag: bytes) -> str:
+    return base64.b64encode(PNG + tag).decode()
+
+
+def _auth(fake, email: str, admin: bool = False) -> dict:
+    token = fake.add_user(email)
+    if admin:
+        fake.users[token].app_metadata["role"] = "admin"
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _age(digest: str, seconds: float):
+    path = blob_store._path(digest)
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def owners(fake):
+    alice, bob = _auth(fake, "alice@example.com"), _auth(fake, "bob@example.com")
+    fake.tables["devices"] = [
+        {"device_id": "a", "owner_id": fake.user_id(alice["Authorization"][7:]), "name": "a"},
+        {"device_id": "b", "owner_id": fake.user_id(bob["Authorization"][7:]), "name": "b"},
+    ]
+    return alice, bob
+
+
+def test_blob_is_only_served_to_the_owner(client, owners):
+    alice, bob = owners
+    response = client.post("/ingest/a", json={"potentiometer_value": 1, "image_data": _image(b"alice")})
+    ref = response.json()["payload"]["image_data"]
+    assert ref.startswith(BLOB_REF_PREFIX)
+    digest = ref.removeprefix(BLOB_REF_PREFIX)
+
+    own = client.get(f"/blobs/{digest}", headers=alice)
+    assert own.status_code == 200 and own.content == PNG + b"alice"
+    assert client.get(f"/blobs/{digest}", headers=bob).status_code == 404
+    assert client.get(f"/blobs/{'0' * 64}", headers=alice).status_code == 404
+
+
+def test_full_queue_does_not_delete_a_shared_blob(client, fake, owners, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_WRITE_BEHIND", True)
+    monkeypatch.setattr(ingest_buffer, "_max_rows", 1)
+    # No flusher runs here, so the first reading stays queued
+    monkeypatch.setattr(ingest_buffer, "_stopping", False)
+    monkeypatch.setattr(ingest_buffer, "_rows", type(ingest_buffer._rows)())
+    reading = {"potentiometer_value": 1, "image_data": _image(b"shared")}
+    assert client.post("/ingest/a", json=reading).status_code == 202
+    assert client.post("/ingest/a", json=reading).status_code == 503
+    queued = ingest_buffer.pending_rows()[0]["payload"]["image_data"]
+    assert blob_store.get(queued.removeprefix(BLOB_REF_PREFIX)) == PNG + b"shared"
+
+
+def test_sweep_keeps_referenced_and_recent_blobs(client, fake, owners, monkeypatch):
+    alice, _ = owners
+    admin = _auth(fake, "admin@example.com", admin=True)
+    stored = blob_store.put(PNG + b"stored")
+    queued = blob_store.put(PNG + b"queued")
+    dead = blob_store.put(PNG + b"dead")
+    orphan = blob_store.put(PNG + b"orphan")
+    recent = blob_store.put(PNG + b"recent")
+    for digest in (stored, queued, dead, orphan):
+        _age(digest, settings.BLOB_GC_GRACE + 60)
+
+    fake.tables["telemetry"] = [{
+        "telemetry_id": 1, "device_id": "a", "created_at": 1000,
+        "payload": {"potentiometer_value": 1, "image_data": BLOB_REF_PREFIX + stored},
+    }]
+    monkeypatch.setattr(ingest_buffer, "_rows", type(ingest_buffer._rows)([
+        {"telemetry_id": 2, "device_id": "a", "payload": {"image_data": BLOB_REF_PREFIX + queued}},
+    ]))
+    with open(settings.INGEST_DEAD_LETTER_FILE, "w") as f:
+        row = {"telemetry_id": 3, "device_id": "a", "payload": {"image_data": BLOB_REF_PREFIX + dead}}
+        f.write(json.dumps({"reason": "test", "row": row}) + "\n")
+
+    assert client.post("/blobs/gc", headers=alice).status_code == 403
+    response = client.post("/blobs/gc", headers=admin)
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 1
+    for digest in (stored, queued, dead, recent):
+        assert blob_store.exists(digest)
+    assert not blob_store.exists(orphan)
+
+
+def test_reuploading_an_old_blob_restarts_its_grace_period():
+    digest = blob_store.put(PNG + b"again")
+    _age(digest, settings.BLOB_GC_GRACE + 60)
+    blob_store.put(PNG + b"again")
+    modified = dict(blob_store.list_blobs())[digest]
+    assert time.time() - modified < 60
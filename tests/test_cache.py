@@ -0,0 +1,82 @@
+import pytest
+
+from app.utils import cache as cache_module
+from app.utils.cache import MISSING, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_get_returns_value_until_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now += 4.9
+    assert cache.get("a") == 1
+    clock.now += 0.2
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", 1, ttl=1)
+    cache.set("long", 2)
+    clock.now += 2
+    assert cache.get("short", None) is None
+    assert cache.get("long") == 2
+
+
+def test_none_is_a_cacheable_value(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("negative", None)
+    assert cache.get("negative") is None
+    assert cache.get("unknown") is MISSING
+
+
+def test_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_pop_and_stats(clock):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "gone") == "gone"
+    cache.get("a")
+    cache.set("b", 2)
+    cache.get("b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_device_registry_batches_misses_and_remembers_unknown_devices(fake):
+    from app.core.device_registry import device_registry
+
+    fake.tables["devices"] = [{"device_id": "1", "owner_id": "alice", "name": "a"}]
+    queries = fake.queries
+    assert device_registry.get_owners(["1", "2", "1"]) == {"1": "alice", "2": None}
+    assert fake.queries == queries + 1
+    assert device_registry.get_owner("2") is None
+    assert fake.queries == queries + 1
@@ -0,0 +1,56 @@
+import pytest
+
+from app.testing.fake_supabase import FakeSupabase
+
+
+@pytest.fixture
+def db() -> FakeSupabase:
+    db = FakeSupabase()
+    db.tables["telemetry"] = [
+        {"telemetry_id": i, "device_id": str(i % 3), "payload": {"potentiometer_value": i * 10}, "created_at": 100 + i}
+        for i in range(1, 10)
+    ]
+    return db
+
+
+def _ids(response):
+    return [row["telemetry_id"] for row in response.data]
+
+
+def test_filters_and_ordering(db):
+    query = db.table("telemetry").select("*").in_("device_id", ["1", "2"]).gte("created_at", 103)
+    assert _ids(query.order("telemetry_id", desc=True).limit(3).execute()) == [8, 7, 5]
+
+
+def test_or_with_nested_and(db):
+    response = (
+        db.table("telemetry").select("telemetry_id")
+        .or_("created_at.lt.103,and(created_at.eq.105,telemetry_id.lt.6)")
+        .order("telemetry_id")
+        .execute()
+    )
+    assert _ids(response) == [1, 2, 5]
+
+
+def test_json_projection_with_alias(db):
+    row = db.table("telemetry").select("telemetry_id, value:payload->potentiometer_value").eq("telemetry_id", 4).execute().data[0]
+    assert row == {"telemetry_id": 4, "value": 40}
+
+
+def test_rows_are_copied(db):
+    db.table("telemetry").select("*").eq("telemetry_id", 1).execute().data[0]["payload"]["potentiometer_value"] = -1
+    assert db.tables["telemetry"][0]["payload"]["potentiometer_value"] == 10
+
+
+def test_insert_and_delete(db):
+    db.table("devices").insert({"device_id": "9", "owner_id": "u", "name": "n"}).execute()
+    assert len(db.table("devices").select("*").eq("owner_id", "u").execute().data) == 1
+    db.table("devices").delete().eq("device_id", "9").execute()
+    assert db.tables["devices"] == []
+
+
+def test_auth_tokens(db):
+    token = db.add_user("a@example.com")
+    assert db.auth.get_user(token).user.id == db.user_id(token)
+    with pytest.raises(Exception):
+        db.auth.get_user("nope")
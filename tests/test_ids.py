@@ -0,0 +1,76 @@
+import os
+import threading
+
+import pytest
+
+from app.utils.ids import EPOCH_MS, MAX_WORKER_ID, SEQUENCE_BITS, WORKER_BITS, SnowflakeGenerator
+
+
+def _worker(telemetry_id: int) -> int:
+    return (telemetry_id >> SEQUENCE_BITS) & MAX_WORKER_ID
+
+
+def test_ids_increase_strictly():
+    generator = SnowflakeGenerator(worker_id=3)
+    ids = [generator.next_id() for _ in range(20000)]
+    assert all(a < b for a, b in zip(ids, ids[1:]))
+    assert {_worker(i) for i in ids} == {3}
+    assert (ids[0] >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS > EPOCH_MS
+
+
+def test_ids_unique_across_threads():
+    generator = SnowflakeGenerator(worker_id=1)
+    results = [[] for _ in range(8)]
+
+    def generate(out):
+        out.extend(generator.next_id() for _ in range(5000))
+
+    threads = [threading.Thread(target=generate, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [i for out in results for i in out]
+    assert len(set(ids)) == len(ids)
+    assert all(out == sorted(out) for out in results)
+
+
+def test_clock_step_back_keeps_ids_increasing(monkeypatch):
+    generator = SnowflakeGenerator(worker_id=0)
+    now = [2_000_000_000.0]
+    monkeypatch.setattr("app.utils.ids.time.time", lambda: now[0])
+    first = generator.next_id()
+    now[0] -= 5
+    assert generator.next_id() > first
+
+
+def test_rejects_out_of_range_worker_id():
+    with pytest.raises(ValueError):
+        SnowflakeGenerator(worker_id=MAX_WORKER_ID + 1)
+
+
+def test_processes_claim_distinct_slots(tmp_path):
+    first = SnowflakeGenerator(slot_dir=str(tmp_path))
+    second = SnowflakeGenerator(slot_dir=str(tmp_path))
+    assert first.worker_id != second.worker_id
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_claims_its_own_slot(tmp_path):
+    generator = SnowflakeGenerator(slot_dir=str(tmp_path))
+    parent_ids = [generator.next_id() for _ in range(100)]
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ids = [generator.next_id() for _ in range(100)]
+            os.write(write_end, f"{generator.worker_id} {min(ids)} {max(ids)}".encode())
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    worker_id, low, high = map(int, os.read(read_end, 200).split())
+    os.waitpid(pid, 0)
+    os.close(read_end)
+    assert worker_id != generator.worker_id
+    assert _worker(low) == _worker(high) == worker_id
+    assert {_worker(i) for i in parent_ids} == {generator.worker_id}
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.core.inference_cache import DiskTier, InferenceCache
+
+
+def _cache(**overrides) -> InferenceCache:
+    options = {"maxsize": 100, "ttl": 60, "max_entry_bytes": 1 << 20}
+    options.update(overrides)
+    return InferenceCache(**options)
+
+
+class Upstream:
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("upstream 500")
+        return f"answer {self.calls}"
+
+
+def test_concurrent_identical_requests_share_one_call():
+    async def run():
+        cache = _cache()
+        upstream = Upstream()
+        waiters = [asyncio.create_task(cache.get_or_compute("k", upstream)) for _ in range(10)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        assert await asyncio.gather(*waiters) == ["answer 1"] * 10
+        assert upstream.calls == 1
+        stats = cache.stats()
+        assert (stats["upstream_calls"], stats["coalesced"], stats["inflight"]) == (1, 9, 0)
+        # Served from memory afterwards
+        assert await cache.get_or_compute("k", upstream) == "answer 1"
+        assert upstream.calls == 1
+
+    asyncio.run(run())
+
+
+def test_different_keys_are_not_coalesced():
+    async def run():
+        cache = _cache()
+        upstream = Upstream()
+        upstream.release.set()
+        await asyncio.gather(cache.get_or_compute("a", upstream), cache.get_or_compute("b", upstream))
+        assert upstream.calls == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def run():
+        cache = _cache()
+        upstream = Upstream(fail=True)
+        waiters = [asyncio.create_task(cache.get_or_compute("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        upstream.fail = False
+        assert await cache.get_or_compute("k", upstream) == "answer 2"
+
+    asyncio.run(run())
+
+
+def test_one_waiter_cancelling_does_not_cancel_the_shared_call():
+    async def run():
+        cache = _cache()
+        upstream = Upstream()
+        first = asyncio.create_task(cache.get_or_compute("k", upstream))
+        second = asyncio.create_task(cache.get_or_compute("k", upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        upstream.release.set()
+        assert await second == "answer 1"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
+
+
+def test_oversized_responses_are_not_cached():
+    async def run():
+        cache = _cache(max_entry_bytes=4)
+        upstream = Upstream()
+        upstream.release.set()
+        await cache.get_or_compute("k", upstream)
+        await cache.get_or_compute("k", upstream)
+        assert upstream.calls == 2
+
+    asyncio.run(run())
+
+
+def test_disk_tier_survives_a_new_memory_tier(tmp_path):
+    async def run():
+        upstream = Upstream()
+        upstream.release.set()
+        await _cache(disk=DiskTier(str(tmp_path), ttl=60, max_bytes=1 << 20)).get_or_compute("k", upstream)
+        fresh = _cache(disk=DiskTier(str(tmp_path), ttl=60, max_bytes=1 << 20))
+        assert await fresh.get_or_compute("k", upstream) == "answer 1"
+        assert upstream.calls == 1
+        assert fresh.stats()["disk_hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_key_ignores_models_prefix_and_hashes_images():
+    text = [{"text": "hi"}]
+    image = [{"inline_data": {"mime_type": "image/png", "data": "aGVsbG8="}}]
+    assert InferenceCache.key("models/gemini-2.5-flash", text) == InferenceCache.key("gemini-2.5-flash", text)
+    assert InferenceCache.key("gemini-2.5-flash", text) != InferenceCache.key("gemini-2.5-pro", text)
+    other = [{"inline_data": {"mime_type": "image/png", "data": "d29ybGQ="}}]
+    assert InferenceCache.key("m", image) != InferenceCache.key("m", other)
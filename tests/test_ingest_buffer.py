@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.core import ingest_buffer as ingest_buffer_module
+from app.core.ingest_buffer import IngestBuffer, IngestBufferFull
+
+
+class DatabaseError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+class Table:
+    """Flush function that records written rows and fails on demand."""
+
+    def __init__(self, fail_times: int = 0, error: Exception = None, bad_ids=()):
+        self.rows = []
+        self.calls = 0
+        self.fail_times = fail_times
+        self.error = error or ConnectionError("connection reset")
+        self.bad_ids = set(bad_ids)
+        self.flushed = threading.Event()
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.fail_times:
+            self.fail_times -= 1
+            raise self.error
+        if any(row["telemetry_id"] in self.bad_ids for row in rows):
+            raise DatabaseError("violates check constraint", code="23514")
+        self.rows.extend(rows)
+        self.flushed.set()
+
+
+def _rows(n: int, start: int = 0):
+    return [{"telemetry_id": start + i, "device_id": "1", "payload": {"potentiometer_value": i}} for i in range(n)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ingest_buffer_module.time, "sleep", lambda seconds: None)
+
+
+def test_flushes_when_batch_is_full():
+    table = Table()
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=10, flush_interval=60)
+    buffer.start()
+    try:
+        buffer.submit(_rows(10))
+        assert table.flushed.wait(5)
+        assert [row["telemetry_id"] for row in table.rows] == list(range(10))
+    finally:
+        buffer.stop()
+
+
+def test_flushes_after_interval():
+    table = Table()
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=1000, flush_interval=0.05)
+    buffer.start()
+    try:
+        buffer.submit(_rows(3))
+        assert table.flushed.wait(5)
+        assert len(table.rows) == 3
+    finally:
+        buffer.stop()
+
+
+def test_stop_drains_queue():
+    table = Table()
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=1000, flush_interval=60)
+    buffer.start()
+    buffer.submit(_rows(25))
+    buffer.stop()
+    assert len(table.rows) == 25
+    assert buffer.stats()["flushed"] == 25
+    with pytest.raises(IngestBufferFull):
+        buffer.submit(_rows(1))
+
+
+def test_submit_is_all_or_nothing_when_full():
+    buffer = IngestBuffer(Table(), max_rows=10, flush_rows=100, flush_interval=60)
+    buffer.submit(_rows(8))
+    with pytest.raises(IngestBufferFull):
+        buffer.submit(_rows(3, start=8))
+    stats = buffer.stats()
+    assert (stats["queued"], stats["accepted"], stats["rejected"]) == (8, 8, 3)
+
+
+def test_transient_errors_are_retried():
+    table = Table(fail_times=2)
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=5, flush_interval=60, max_retries=3)
+    buffer._write(_rows(5))
+    assert len(table.rows) == 5
+    assert table.calls == 3
+    assert buffer.dropped == 0
+
+
+def test_rows_dropped_after_retries_go_to_dead_letter(tmp_path):
+    dead_letter = tmp_path / "dead.jsonl"
+    table = Table(fail_times=10)
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=5, flush_interval=60, max_retries=2, dead_letter_path=str(dead_letter))
+    buffer._write(_rows(4))
+    assert table.calls == 2
+    assert buffer.dropped == 4
+    lines = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [line["row"]["telemetry_id"] for line in lines] == [0, 1, 2, 3]
+
+
+def test_permanent_error_bisects_to_the_bad_rows(tmp_path):
+    dead_letter = tmp_path / "dead.jsonl"
+    table = Table(bad_ids={17, 60})
+    buffer = IngestBuffer(table, max_rows=1000, flush_rows=100, flush_interval=60, dead_letter_path=str(dead_letter))
+    buffer._write(_rows(100))
+    assert sorted(row["telemetry_id"] for row in table.rows) == [i for i in range(100) if i not in (17, 60)]
+    assert buffer.flushed == 98
+    assert buffer.dropped == 2
+    dropped = [json.loads(line)["row"]["telemetry_id"] for line in dead_letter.read_text().splitlines()]
+    assert dropped == [17, 60]
+
+
+def test_permanent_error_is_not_retried():
+    table = Table(fail_times=1, error=DatabaseError("null value in column", code="23502"))
+    buffer = IngestBuffer(table, max_rows=10, flush_rows=10, flush_interval=60, max_retries=5)
+    started = time.monotonic()
+    buffer._write(_rows(1))
+    assert table.calls == 1
+    assert buffer.dropped == 1
+    assert time.monotonic() - started < 1
+
+
+def test_failing_post_flush_handler_does_not_rewrite_rows(tmp_path):
+    dead_letter = tmp_path / "dead.jsonl"
+    table = Table()
+
+    def on_flushed(rows):
+        raise RuntimeError("leaderboard unavailable")
+
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=10, flush_interval=60, dead_letter_path=str(dead_letter), on_flushed=on_flushed)
+    buffer._write(_rows(10))
+    assert table.calls == 1
+    assert len(table.rows) == 10
+    assert (buffer.flushed, buffer.dropped) == (10, 0)
+    assert not dead_letter.exists()
+
+
+def test_post_flush_handler_sees_only_stored_rows():
+    table = Table(bad_ids={3})
+    seen = []
+    buffer = IngestBuffer(table, max_rows=100, flush_rows=10, flush_interval=60, on_flushed=seen.extend)
+    buffer._write(_rows(8))
+    assert sorted(row["telemetry_id"] for row in seen) == [0, 1, 2, 4, 5, 6, 7]
+
+
+def test_failing_post_insert_hook_still_acknowledges_the_insert(client, fake, monkeypatch):
+    from app.core.leaderboard import leaderboard
+
+    token = fake.add_user("hooks@example.com")
+    fake.tables["devices"].append({"device_id": "5", "owner_id": fake.user_id(token), "name": "hooks"})
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("leaderboard unavailable")
+
+    monkeypatch.setattr(leaderboard, "add_rows", broken)
+    response = client.post("/ingest/5/batch", json=[{"potentiometer_value": 1}, {"potentiometer_value": 2}])
+    assert response.status_code == 200, response.text
+    assert len(fake.tables["telemetry"]) == 2
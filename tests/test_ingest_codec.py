@@ -0,0 +1,118 @@
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import ingest_codec
+from app.core.config import settings
+from app.core.ingest_codec import FRAME, FRAME_CONTENT_TYPE, decode_frames, decompress, frame_payloads
+
+try:
+    from compression import zstd as _zstd
+
+    def zstd_compress(data: bytes) -> bytes:
+        return _zstd.compress(data)
+except ImportError:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+    def zstd_compress(data: bytes) -> bytes:
+        if zstandard is None:
+            pytest.skip("no zstd module")
+        return zstandard.ZstdCompressor().compress(data)
+
+
+BODY = json.dumps([{"potentiometer_value": i} for i in range(100)]).encode()
+
+
+def test_gzip_round_trip():
+    assert decompress(gzip.compress(BODY), "gzip") == BODY
+
+
+def test_zstd_round_trip():
+    assert decompress(zstd_compress(BODY), "zstd") == BODY
+
+
+def test_stacked_encodings_are_undone_in_reverse():
+    body = zstd_compress(gzip.compress(BODY))
+    assert decompress(body, "gzip, zstd") == BODY
+
+
+def test_identity_and_unknown_encodings():
+    assert decompress(BODY, "identity") == BODY
+    with pytest.raises(HTTPException) as error:
+        decompress(BODY, "br")
+    assert error.value.status_code == 415
+
+
+def test_decompressed_size_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_BODY_BYTES", 1024)
+    with pytest.raises(HTTPException) as error:
+        decompress(gzip.compress(b"0" * 100_000), "gzip")
+    assert error.value.status_code == 413
+
+
+def test_corrupt_body_is_a_bad_request():
+    with pytest.raises(HTTPException) as error:
+        decompress(gzip.compress(BODY)[:-10], "gzip")
+    assert error.value.status_code == 400
+
+
+def test_frames_round_trip():
+    body = FRAME.pack(7, 1_700_000_000.5, 123.0) + FRAME.pack(0, 0, 4.5)
+    items = decode_frames(body)
+    assert items == [
+        {"device_id": 7, "payload": {"potentiometer_value": 123.0, "timestamp": 1_700_000_000.5}},
+        {"device_id": 0, "payload": {"potentiometer_value": 4.5}},
+    ]
+    assert frame_payloads(items, "7") == [item["payload"] for item in items]
+    with pytest.raises(HTTPException):
+        frame_payloads(items, "8")
+
+
+def test_truncated_frames_are_rejected():
+    with pytest.raises(HTTPException) as error:
+        decode_frames(FRAME.pack(1, 0, 1.0)[:-1])
+    assert error.value.status_code == 400
+
+
+@pytest.fixture
+def device(fake):
+    token = fake.add_user("codec@example.com")
+    fake.tables["devices"].append({"device_id": "42", "owner_id": fake.user_id(token), "name": "codec"})
+    return "42"
+
+
+def test_gzip_batch_through_the_api(client, fake, device):
+    response = client.post(
+        f"/ingest/{device}/batch",
+        content=gzip.compress(BODY),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["accepted"] == 100
+    assert sorted(row["payload"]["potentiometer_value"] for row in fake.tables["telemetry"]) == list(range(100))
+
+
+def test_frames_through_the_api(client, fake, device):
+    body = b"".join(FRAME.pack(42, 0, float(i)) for i in range(5))
+    response = client.post(f"/ingest/{device}/batch", content=body, headers={"Content-Type": FRAME_CONTENT_TYPE})
+    assert response.status_code == 200, response.text
+    assert [row["payload"]["potentiometer_value"] for row in fake.tables["telemetry"]] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_msgpack_through_the_api(client, fake, device):
+    msgpack = pytest.importorskip("msgpack")
+    body = msgpack.packb([{"potentiometer_value": 1}, {"potentiometer_value": 2}])
+    response = client.post(f"/ingest/{device}/batch", content=body, headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 200, response.text
+    assert response.json()["accepted"] == 2
+
+
+def test_msgpack_without_module_is_unsupported(client, device, monkeypatch):
+    monkeypatch.setattr(ingest_codec, "msgpack", None)
+    response = client.post(f"/ingest/{device}/batch", content=b"\x90", headers={"Content-Type": "application/msgpack"})
+    assert response.status_code == 415
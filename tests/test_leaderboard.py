@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from app.core import leaderboard as leaderboard_module
+from app.core.leaderboard import Leaderboard, SlidingWindow
+from app.utils.scoring import score_value
+
+
+def _board(**overrides) -> Leaderboard:
+    options = {"rebuild_interval": 0, "rank_ttl": 0, "window_ttl": 0, "window_settle": 60}
+    options.update(overrides)
+    return Leaderboard(**options)
+
+
+@pytest.fixture
+def world(fake):
+    """Two users with one device each."""
+    fake.tables["devices"] = [
+        {"device_id": "1", "owner_id": "alice", "name": "a"},
+        {"device_id": "2", "owner_id": "bob", "name": "b"},
+    ]
+    return fake
+
+
+def _row(telemetry_id: int, device_id: str, value: float, created_at: int):
+    return {
+        "telemetry_id": telemetry_id,
+        "device_id": device_id,
+        "payload": {"potentiometer_value": value},
+        "created_at": created_at,
+    }
+
+
+def test_sliding_window_expires_whole_buckets():
+    window = SlidingWindow(length=3600, bucket=60)
+    now = 10_000_000
+    window.add("a", 1.0, now - 3000, now)
+    window.add("a", 0.5, now - 100, now)
+    window.add("b", 0.25, now - 4000, now)  # already outside the window
+    assert window.totals == {"a": [1.5, 2]}
+    window.expire(now + 700)
+    assert window.totals == {"a": [0.5, 1]}
+    window.expire(now + 3600)
+    assert window.totals == {}
+
+
+def test_rebuild_ranks_users(world):
+    now = int(time.time())
+    world.tables["telemetry"] = [_row(1, "1", 100, now - 10), _row(2, "2", 8000, now - 10), _row(3, "2", 7000, now - 10)]
+    board = _board()
+    board.rebuild()
+    assert [owner for owner, _ in board.ranking().entries] == ["alice", "bob"]
+    assert board.rank_of("bob") == (2, board.ranking().entries[1][1], 2)
+    assert board.rank_of("carol") is None
+    assert board.stats()["records"] == 3
+
+
+def test_ingest_during_rebuild_is_counted_once(world, monkeypatch):
+    now = int(time.time())
+    world.tables["telemetry"] = [_row(i, "1", 100, now - 5) for i in range(1, 11)]
+    board = _board()
+    scan = leaderboard_module.scan_telemetry
+
+    def scan_with_concurrent_ingest(client, columns, **kwargs):
+        rows = list(scan(client, columns, **kwargs))
+        # Row 10 was committed before the scan, row 11 after it; both reach add() now
+        board.add("alice", 100, 10, now - 5)
+        board.add("alice", 100, 11, now - 5)
+        return iter(rows)
+
+    monkeypatch.setattr(leaderboard_module, "scan_telemetry", scan_with_concurrent_ingest)
+    board.rebuild()
+    assert board.stats()["records"] == 11
+
+
+def test_concurrent_first_callers_wait_for_the_build(world, monkeypatch):
+    now = int(time.time())
+    world.tables["telemetry"] = [_row(i, "1", 100, now - 5) for i in range(1, 6)]
+    board = _board()
+    scan = leaderboard_module.scan_telemetry
+    started = threading.Event()
+
+    def slow_scan(*args, **kwargs):
+        started.set()
+        time.sleep(0.2)
+        return scan(*args, **kwargs)
+
+    monkeypatch.setattr(leaderboard_module, "scan_telemetry", slow_scan)
+    first = threading.Thread(target=board.ensure_fresh)
+    first.start()
+    started.wait(5)
+    board.ensure_fresh()
+    assert board.ranking().entries and board.stats()["records"] == 5
+    first.join()
+
+
+def test_rebuild_endpoint_requires_admin(client, fake):
+    token = fake.add_user("user@example.com")
+    assert client.post("/users/leaderboard/rebuild").status_code in (401, 403)
+    assert client.post("/users/leaderboard/rebuild", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+
+def test_windows_read_other_workers_rows(world):
+    now = int(time.time())
+    world.tables["telemetry"] = [
+        _row(1, "1", 4000, now - 1800),  # hour
+        _row(2, "2", 4000, now - 2 * 3600),  # day
+        _row(3, "2", 4000, now - 3 * 86400),  # week
+        _row(4, "1", 4000, now - 30 * 86400),  # all-time only
+    ]
+    board = _board()
+    assert [owner for owner, _ in board.ranking("hour").entries] == ["alice"]
+    assert sorted(owner for owner, _ in board.ranking("day").entries) == ["alice", "bob"]
+
+    # Written by another worker: never passes through this board's add()
+    world.tables["telemetry"].append(_row(5, "2", 4000, now - 1))
+    assert sorted(owner for owner, _ in board.ranking("hour").entries) == ["alice", "bob"]
+    with board._lock:
+        assert board._window_totals("week")["bob"][1] == 3
+
+
+def test_window_refresh_does_not_double_count(world):
+    now = int(time.time())
+    world.tables["telemetry"] = [_row(i, "1", 4000, now - 30 * i) for i in range(1, 20)]
+    board = _board(window_settle=120)
+    for _ in range(5):
+        board.ranking("hour")
+    with board._lock:
+        total, count = board._window_totals("hour")["alice"]
+    assert count == 19
+    assert total == pytest.approx(19 * score_value(4000))
+
+
+def test_first_window_refresh_failure_propagates(world, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ConnectionError("database unavailable")
+
+    board = _board()
+    monkeypatch.setattr(leaderboard_module, "scan_telemetry", broken)
+    with pytest.raises(ConnectionError):
+        board.ranking("day")
+    monkeypatch.undo()
+    assert board.ranking("day").entries == []
+
+
+def test_window_refresh_reads_owners_in_one_query(world, monkeypatch):
+    now = int(time.time())
+    world.tables["devices"] = [{"device_id": str(i), "owner_id": f"user{i}", "name": ""} for i in range(10)]
+    world.tables["telemetry"] = [_row(i, str(i), 4000, now - 60) for i in range(10)]
+    monkeypatch.setattr(leaderboard_module, "REBUILD_CHUNK_ROWS", 2)
+    board = _board()
+    before = world.queries
+    assert len(board.ranking("hour").entries) == 10
+    # The devices select and one telemetry page
+    assert world.queries - before == 2
+
+
+def test_window_request_does_not_rebuild_all_time(client, world, monkeypatch):
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("all-time rebuild for a windowed request")
+
+    monkeypatch.setattr(leaderboard_module.leaderboard, "rebuild", no_rebuild)
+    assert client.get("/users/leaderboard", params={"window": "day"}).status_code == 200
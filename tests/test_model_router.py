@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import app.routers.inference as inference
+from app.core.config import settings
+from app.core.model_router import ModelRouter
+
+
+def _router() -> ModelRouter:
+    return ModelRouter(failure_threshold=2, cooldown=30, not_found_cooldown=300, ewma_alpha=0.5)
+
+
+def _half_open(router: ModelRouter, model: str):
+    health = router._get(model)
+    health.consecutive_failures = router.failure_threshold
+    health.open_until = time.monotonic() - 1
+
+
+def test_repeated_failures_open_the_circuit():
+    router = _router()
+    router.record_failure("pro", 503)
+    assert router.order(["pro", "flash"]) == ["pro", "flash"]
+    router.record_failure("pro", 503)
+    assert router.order(["pro", "flash"]) == ["flash"]
+    # Bad requests say nothing about the model
+    router.record_failure("flash", 400)
+    router.record_failure("flash", 400)
+    assert router.order(["flash"]) == ["flash"]
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    router = _router()
+    _half_open(router, "pro")
+    assert router.begin("pro")
+    assert not router.begin("pro")
+    assert router.order(["pro", "flash"]) == ["flash"]
+    router.record_success("pro", 0.1)
+    assert router.begin("pro") and router.begin("pro")
+    assert router.stats()["pro"]["circuit_open"] is False
+
+
+def test_failed_probe_reopens_and_release_frees_the_probe():
+    router = _router()
+    _half_open(router, "pro")
+    assert router.begin("pro")
+    router.release("pro")
+    assert router.begin("pro")
+    router.record_failure("pro", 503)
+    assert router.stats()["pro"]["circuit_open"] is True
+    assert router.order(["pro", "flash"]) == ["flash"]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    router = _router()
+    monkeypatch.setattr(inference, "model_router", router)
+    latency = {"gemini-2.5-pro": 0.5}
+    calls = []
+
+    async def fake_generate(model, parts):
+        calls.append(model)
+        await asyncio.sleep(latency.get(model, 0.02))
+        return f"ok {model}"
+
+    monkeypatch.setattr(inference, "_gemini_generate", fake_generate)
+    return router, calls
+
+
+def test_hedge_loser_is_recorded(upstream, monkeypatch):
+    router, calls = upstream
+    monkeypatch.setattr(settings, "INFERENCE_HEDGE_AFTER", 0.05)
+    result = asyncio.run(inference._gemini_generate_with_fallback("gemini-2.5-pro", []))
+    assert result == "ok gemini-pro-latest"
+    assert calls == ["gemini-2.5-pro", "gemini-pro-latest"]
+    stats = router.stats()
+    assert stats["gemini-2.5-pro"]["hedge_losses"] == 1
+    assert stats["gemini-pro-latest"]["successes"] == 1
+
+
+def test_client_disconnect_is_not_a_hedge_loss(upstream, monkeypatch):
+    router, _ = upstream
+    monkeypatch.setattr(settings, "INFERENCE_HEDGE_AFTER", 0)
+    _half_open(router, "gemini-2.5-pro")
+
+    async def run():
+        task = asyncio.create_task(inference._gemini_generate_with_fallback("gemini-2.5-pro", []))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    stats = router.stats()["gemini-2.5-pro"]
+    assert stats["hedge_losses"] == 0
+    assert stats["probing"] is False
+
+
+def test_concurrent_requests_send_one_probe_to_a_half_open_model(upstream, monkeypatch):
+    router, calls = upstream
+    monkeypatch.setattr(settings, "INFERENCE_HEDGE_AFTER", 0)
+    _half_open(router, "gemini-2.5-pro")
+
+    async def run():
+        return await asyncio.gather(
+            *(inference._gemini_generate_with_fallback("gemini-2.5-pro", []) for _ in range(5))
+        )
+
+    results = asyncio.run(run())
+    assert calls.count("gemini-2.5-pro") == 1
+    assert results.count("ok gemini-2.5-pro") == 1
+    assert router.stats()["gemini-2.5-pro"]["circuit_open"] is False
+
+
+def test_non_fallthrough_errors_surface_immediately(upstream, monkeypatch):
+    router, calls = upstream
+    monkeypatch.setattr(settings, "INFERENCE_HEDGE_AFTER", 0)
+
+    async def bad_request(model, parts):
+        calls.append(model)
+        raise HTTPException(status_code=400, detail="bad image")
+
+    monkeypatch.setattr(inference, "_gemini_generate", bad_request)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(inference._gemini_generate_with_fallback("gemini-2.5-pro", []))
+    assert exc.value.status_code == 400
+    assert calls == ["gemini-2.5-pro"]
+
+
+def test_remembers_a_bounded_number_of_models():
+    router = ModelRouter(failure_threshold=2, cooldown=30, not_found_cooldown=300, ewma_alpha=0.5, max_models=5)
+    fallbacks = list(inference.FALLBACK_MODELS)
+    for i in range(50):
+        router.order([f"client-model-{i}", *fallbacks])
+    assert len(router.stats()) == 5
+    assert set(fallbacks) <= set(router.stats())
+
+
+def test_upstream_metrics_label_unknown_models_as_other(monkeypatch):
+    import httpx
+
+    from app.core.metrics import upstream_duration
+
+    def reply(request):
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "hi"}]}}]})
+
+    client = httpx.AsyncClient(base_url="http://gemini.test", transport=httpx.MockTransport(reply))
+    monkeypatch.setattr(inference, "gemini_client", lambda: client)
+    monkeypatch.setattr(settings, "GEMINI_API_KEY", "test")
+
+    async def run():
+        for model in ("models/made-up-1", "made-up-2", "gemini-2.5-flash"):
+            assert await inference._gemini_generate(model, []) == "hi"
+
+    asyncio.run(run())
+    targets = {labels[2] for labels in upstream_duration._children if labels[0] == "gemini"}
+    assert targets == {"other", "gemini-2.5-flash"}
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+import app.core.rollups as rollups_module
+from app.core.rollups import RETENTION, RollupStore
+
+
+@pytest.fixture
+def scans(fake, monkeypatch):
+    """(since, until) of every telemetry scan the rollups make."""
+    calls = []
+    scan = rollups_module.scan_telemetry
+
+    def recording_scan(client, columns, since=None, until=None, **kwargs):
+        calls.append((since, until))
+        return scan(client, columns, since=since, until=until, **kwargs)
+
+    monkeypatch.setattr(rollups_module, "scan_telemetry", recording_scan)
+    return calls
+
+
+def _store(**overrides) -> RollupStore:
+    options = {"max_devices": 10, "refresh_interval": 3600, "settle_seconds": 120}
+    options.update(overrides)
+    return RollupStore(**options)
+
+
+def _rows(fake, first_id: int, count: int, created_at: int, value: float = 1.0):
+    rows = [
+        {"telemetry_id": first_id + i, "device_id": "7", "payload": {"potentiometer_value": value}, "created_at": created_at}
+        for i in range(count)
+    ]
+    fake.tables.setdefault("telemetry", []).extend(rows)
+    return rows
+
+
+def _total(store: RollupStore, resolution: str = "hour", days: int = 1) -> int:
+    now = int(time.time())
+    return sum(p["count"] for p in store.query("7", resolution, now - days * 86400, now + 1))
+
+
+def test_refresh_does_not_double_count(fake, scans):
+    store = _store()
+    now = int(time.time())
+    _rows(fake, 1, 30, now - 600)
+    assert _total(store) == 30
+
+    # Ingested here, then committed: counted once before and after the refresh
+    store.add_rows(_rows(fake, 100, 10, now - 5, value=5.0))
+    assert _total(store) == 40
+    # Written by another worker: shows up at the next refresh
+    _rows(fake, 1000, 20, now - 5, value=2.0)
+    assert _total(store) == 40
+    store.refresh_interval = 0
+    assert [_total(store) for _ in range(3)] == [60, 60, 60]
+
+
+def test_cold_load_only_scans_the_requested_range(fake, scans):
+    store = _store()
+    now = int(time.time())
+    _rows(fake, 1, 5, now - 400 * 86400)
+    _rows(fake, 100, 5, now - 30 * 86400)
+    _rows(fake, 200, 5, now - 600)
+
+    assert _total(store, "minute", days=1) == 5
+    since, _ = scans[0]
+    assert since >= now - 86400 - 60
+
+    # A longer range extends the series backwards once, without rescanning what is loaded
+    assert _total(store, "day", days=60) == 10
+    assert scans[-1] == (pytest.approx(now - 60 * 86400, abs=86400), since)
+    assert _total(store, "day", days=60) == 10
+    # Never further back than the resolution keeps
+    _total(store, "hour", days=1000)
+    assert min(s for s, _ in scans) >= now - RETENTION["hour"] - 3600
+
+
+def test_ingest_starts_series_for_unqueried_devices(fake, scans):
+    store = _store()
+    now = int(time.time())
+    _rows(fake, 1, 3, now - 3600)
+    store.add_rows(_rows(fake, 100, 4, now - 5))
+    assert store.stats()["devices"] == 1
+    assert _total(store) == 7
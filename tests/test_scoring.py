@@ -0,0 +1,69 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from app.utils.scoring import calculate_score, group_average_scores, record_scores, score_records
+from benchmarks.bench_scoring import legacy_calculate_score
+
+
+def _records(n: int, seed: int):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        value = rng.choice([rng.uniform(0, 8190), rng.randint(0, 8190), 0, 8190, -5.5, 9000.0])
+        payload = {"potentiometer_value": value}
+        records.append({"telemetry_id": i, "payload": json.dumps(payload) if i % 7 == 0 else payload})
+    return records
+
+
+# Inputs the original loop handled without raising
+EDGE_CASES = [
+    {"payload": {}},
+    {},
+    {"payload": "not json"},
+    {"payload": '{"potentiometer_value": 10}'},
+    {"payload": {"potentiometer_value": True}},
+    {"payload": {"potentiometer_value": 4095.5, "timestamp": "2025-01-01T00:00:00"}},
+]
+
+
+@pytest.fixture(autouse=True)
+def quiet(capsys):
+    # The original prints every value
+    yield
+    capsys.readouterr()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_record_scores_match_original(seed):
+    records = _records(500, seed) + EDGE_CASES
+    assert record_scores(records) == [legacy_calculate_score([r]) for r in records]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_calculate_score_matches_original(seed):
+    records = _records(1000, seed) + EDGE_CASES
+    assert calculate_score(records) == legacy_calculate_score(records)
+    for record in EDGE_CASES:
+        assert calculate_score([record]) == legacy_calculate_score([record])
+    assert calculate_score([]) == legacy_calculate_score([]) == 0.0
+
+
+def test_group_averages_match_original():
+    records = _records(900, 42)
+    keys = [r["telemetry_id"] % 9 for r in records]
+    groups = {}
+    for key, record in zip(keys, records):
+        groups.setdefault(key, []).append(record)
+    expected = {key: legacy_calculate_score(group) for key, group in groups.items()}
+    assert group_average_scores(score_records(records), keys) == expected
+
+
+def test_non_numeric_values_are_skipped():
+    # The original raised a TypeError on these; they are now left out of the average
+    records = [{"payload": {"potentiometer_value": "high"}}, {"payload": {"potentiometer_value": 0}}]
+    assert np.isnan(score_records(records)[0])
+    assert record_scores(records) == [0.0, 1.0]
+    assert calculate_score(records) == 1.0
@@ -0,0 +1,83 @@
+import time
+
+import jwt
+import pytest
+
+from app.core import security
+from app.core.config import settings
+
+SECRET = "test-secret-with-enough-bytes-for-hs256"
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_cache():
+    security._token_cache.clear()
+    yield
+    security._token_cache.clear()
+
+
+@pytest.fixture
+def local_jwt(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(settings, "SUPABASE_JWT_AUDIENCE", "authenticated")
+
+
+def _token(secret: str = SECRET, **claims) -> str:
+    payload = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 3600, "email": "u@example.com"}
+    payload.update(claims)
+    return jwt.encode({k: v for k, v in payload.items() if v is not None}, secret, algorithm="HS256")
+
+
+def _get(client, token: str):
+    return client.get("/devices/list", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_valid_token_is_verified_without_calling_supabase(client, fake, local_jwt):
+    response = _get(client, _token())
+    assert response.status_code == 200, response.text
+    assert fake.auth_calls == 0
+
+
+@pytest.mark.parametrize("token", [
+    _token(secret="some-other-secret-that-is-long-enough"),
+    _token(exp=int(time.time()) - 10),
+    _token(aud="anon"),
+    _token(sub=None),
+    _token(exp=None),
+    "not-a-jwt",
+])
+def test_invalid_tokens_are_rejected(client, fake, local_jwt, token):
+    assert _get(client, token).status_code == 401
+    assert len(security._token_cache) == 0
+
+
+def test_cached_user_never_outlives_exp(client, local_jwt, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_TOKEN_CACHE_TTL", 300)
+    token = _token(exp=int(time.time()) + 5)
+    assert _get(client, token).status_code == 200
+    (expires_at, _), = security._token_cache._data.values()
+    assert expires_at - time.monotonic() <= 5
+
+
+def test_cache_ttl_caps_long_lived_tokens(client, local_jwt, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_TOKEN_CACHE_TTL", 30)
+    assert _get(client, _token()).status_code == 200
+    (expires_at, _), = security._token_cache._data.values()
+    assert expires_at - time.monotonic() <= 30
+
+
+def test_remote_validation_is_cached_only_with_exp(client, fake):
+    # The fake's opaque tokens carry no exp, so every request must be checked remotely
+    token = fake.add_user("remote@example.com")
+    assert _get(client, token).status_code == 200
+    assert _get(client, token).status_code == 200
+    assert fake.auth_calls == 2
+    assert _get(client, "unknown").status_code == 401
+
+
+def test_remote_verification_is_timed(client, fake):
+    from app.core.metrics import upstream_duration
+
+    token = fake.add_user("remote@example.com")
+    assert _get(client, token).status_code == 200
+    assert ("supabase", "auth", "get_user", "ok") in upstream_duration._children
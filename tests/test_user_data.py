@@ -0,0 +1,82 @@
+import base64
+import json
+
+import pytest
+
+
+@pytest.fixture
+def owner(fake):
+    token = fake.add_user("owner@example.com")
+    user_id = fake.user_id(token)
+    fake.tables["devices"] = [
+        {"device_id": "1", "owner_id": user_id, "name": "a"},
+        {"device_id": "2", "owner_id": user_id, "name": "b"},
+        {"device_id": "3", "owner_id": "someone-else", "name": "c"},
+    ]
+    # Several rows share a created_at so the telemetry_id tie-break matters
+    fake.tables["telemetry"] = [
+        {"telemetry_id": i, "device_id": str(1 + i % 3), "payload": {"potentiometer_value": i}, "created_at": 1000 + i // 4}
+        for i in range(1, 41)
+    ]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_pages_cover_every_row_once(client, fake, owner):
+    expected = [
+        telemetry_id for _, telemetry_id in sorted(
+            ((r["created_at"], r["telemetry_id"]) for r in fake.tables["telemetry"] if r["device_id"] != "3"),
+            reverse=True,
+        )
+    ]
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 7, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/users/data", params=params, headers=owner)
+        assert response.status_code == 200
+        seen += [int(r["telemetry_id"]) for r in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == expected
+
+
+@pytest.mark.parametrize("cursor", [
+    "%%%not-base64",
+    _cursor([1000, 5]),
+    _cursor({"created_at": 1000}),
+    _cursor({"created_at": 1000, "telemetry_id": 5, "extra": 1}),
+    _cursor({"created_at": "1000,device_id.neq.0", "telemetry_id": 5}),
+    _cursor({"created_at": 1000, "telemetry_id": "5)"}),
+    _cursor({"created_at": 1000.5, "telemetry_id": 5}),
+    _cursor({"created_at": True, "telemetry_id": 5}),
+    _cursor({"created_at": None, "telemetry_id": 5}),
+])
+@pytest.mark.parametrize("path", ["/users/data", "/users/data/stream"])
+def test_crafted_cursors_are_rejected(client, owner, path, cursor):
+    response = client.get(path, params={"cursor": cursor}, headers=owner)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("path", ["/users/data", "/users/data/stream"])
+def test_large_ids_are_sent_as_exact_strings(client, fake, owner, path):
+    big = (1 << 57) + 1  # not representable as a double
+    fake.tables["telemetry"] = [
+        {"telemetry_id": big + i, "device_id": "1", "payload": {"potentiometer_value": 1}, "created_at": 2000}
+        for i in range(3)
+    ]
+    response = client.get(path, params={"limit": 2}, headers=owner)
+    assert response.status_code == 200
+    if path.endswith("stream"):
+        records = [json.loads(line) for line in response.text.splitlines() if line]
+    else:
+        records = response.json()
+    assert [r["telemetry_id"] for r in records][:2] == [str(big + 2), str(big + 1)]
+
+    if not path.endswith("stream"):
+        rest = client.get(path, params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]}, headers=owner)
+        assert [r["telemetry_id"] for r in rest.json()] == [str(big)]